@@ -0,0 +1,146 @@
+# replays recorded bulk requests against an ES cluster or a local stand-in
+#
+#   (env) $ python -m bench.replay record.gz --fake 9200
+#   (env) $ python -m bench.replay records/*.gz --fake 9200
+#   (env) $ python -m bench.replay record.gz --target http://localhost:9200 \
+#             --speed 10 --concurrency 8
+
+import argparse
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from src.recorder import load
+
+HEADERS = {"Content-Type": "application/json"}
+
+
+class FakeES(BaseHTTPRequestHandler):
+    """answers every request like a healthy cluster, counting bulk bytes"""
+
+    def do_HEAD(self):
+        self.reply(200, b"")
+
+    def do_PUT(self):
+        self.read_body()
+        self.reply(200, b'{"acknowledged":true}')
+
+    def do_POST(self):
+        body = self.read_body()
+        stats = self.server.stats
+        with stats["lock"]:
+            stats["requests"] += 1
+            stats["bytes"] += len(body)
+        self.reply(200, b'{"took":1,"errors":false,"items":[]}')
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fake(port=0):
+    """starts the stand-in on a background thread, port 0 picks a free one"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeES)
+    server.stats = {"lock": threading.Lock(), "requests": 0, "bytes": 0}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def payload(entry):
+    """the recorded payload, or filler docs of the recorded count and size"""
+    if "payload" in entry:
+        return entry["payload"]
+    docs = max(entry["docs"], 1)
+    meta = '{"index":{}}\n'
+    overhead = len(meta) + len(json.dumps({"replay": ""})) + 1
+    pad = max(entry["bytes"] // docs - overhead, 0)
+    return (meta + json.dumps({"replay": "x" * pad}) + "\n") * docs
+
+
+def send(target, entry):
+    url = "{}/{}/_doc/_bulk".format(target.rstrip("/"), entry["index"])
+    clock = time.perf_counter()
+    try:
+        r = requests.post(url, data=payload(entry), headers=HEADERS, timeout=30)
+        status = r.status_code
+    except requests.exceptions.RequestException as err:
+        print("replay_error: {}".format(err))
+        status = None
+    return status, time.perf_counter() - clock
+
+
+def replay(entries, target, speed=1.0, concurrency=4):
+    """
+    sends the entries with the same gaps between them as when recorded,
+    divided by speed (0 sends them back to back), with up to concurrency
+    requests in flight. returns a summary of the run.
+    """
+    entries = sorted(entries, key=lambda e: e["t"])
+    if not entries:
+        return {"requests": 0}
+    first = entries[0]["t"]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = []
+        for entry in entries:
+            if speed:
+                delay = (entry["t"] - first) / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(pool.submit(send, target, entry))
+        results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+
+    durations = sorted(d for _, d in results)
+    return {
+        "requests": len(results),
+        "errors": sum(1 for s, _ in results if s != 200),
+        "docs": sum(e["docs"] for e in entries),
+        "bytes": sum(e["bytes"] for e in entries),
+        "elapsed": round(elapsed, 3),
+        "recorded_span": round(entries[-1]["t"] - first, 3),
+        "p50": round(durations[len(durations) // 2], 4),
+        "p99": round(durations[int(len(durations) * 0.99)], 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="replay recorded bulk requests")
+    parser.add_argument(
+        "record", nargs="+", help="files written with RECORD_FILE, or uploaded"
+    )
+    parser.add_argument("--target", help="ES url to replay against")
+    parser.add_argument("--fake", type=int, help="port for a local ES stand-in")
+    parser.add_argument("--speed", type=float, default=1.0, help="0 for no gaps")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    target = args.target
+    if args.fake is not None:
+        server = serve_fake(args.fake)
+        target = "http://127.0.0.1:{}".format(server.server_address[1])
+    if not target:
+        parser.error("one of --target or --fake is required")
+
+    entries = itertools.chain.from_iterable(load(path) for path in args.record)
+    summary = replay(entries, target, args.speed, args.concurrency)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
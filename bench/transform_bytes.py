@@ -0,0 +1,62 @@
+# compares bytes sent to the bulk api with and without a transform
+#
+#   (env) $ python -m bench.transform_bytes
+
+import json
+import random
+import time
+
+from src.es_stream import prepare_bulk_doc
+import src.es_stream
+
+DOCS = 20000
+RULES = {
+    "sample": {"field": "level", "rates": {"debug": 0.1}},
+    "drop": ["stack_trace", "request.body"],
+    "rename": {"msg": "message"},
+    "flatten": True,
+    "truncate": 256,
+}
+
+
+def synthetic_docs(count):
+    levels = ["debug"] * 6 + ["info"] * 3 + ["error"]
+    for i in range(count):
+        level = random.choice(levels)
+        doc = {
+            "timestamp": "2020-01-01T00:00:{:02d}".format(i % 60),
+            "level": level,
+            "msg": "request {} handled".format(i),
+            "request": {
+                "path": "/path/page{}.html".format(i % 100),
+                "body": "x" * random.randint(512, 4096),
+            },
+            "user_agent": "Mozilla/5.0 " * 40,
+        }
+        if level == "error":
+            doc["stack_trace"] = "Traceback (most recent call last):\n" * 100
+        yield json.dumps(doc)
+
+
+def measure(docs, service):
+    start = time.perf_counter()
+    bulk_doc = prepare_bulk_doc(docs, service)
+    return len(bulk_doc.encode("utf-8")), time.perf_counter() - start
+
+
+def main():
+    random.seed(0)
+    docs = list(synthetic_docs(DOCS))
+    src.es_stream.TRANSFORMS["bench"] = RULES
+
+    raw_bytes, raw_time = measure(docs, None)
+    new_bytes, new_time = measure(docs, "bench")
+
+    print("docs:          {}".format(DOCS))
+    print("bytes (raw):   {} in {:.3f}s".format(raw_bytes, raw_time))
+    print("bytes (xform): {} in {:.3f}s".format(new_bytes, new_time))
+    print("reduction:     {:.1%}".format(1 - new_bytes / raw_bytes))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,3 +2,75 @@
 
 REGION = "us-east-1"
 ES_BASE_URL = "https://__RANDOM_STRING__.us-east-1.es.amazonaws.com"
+
+# Sign ES requests with SigV4 using the lambda role, so the domain access
+# policy can be restricted to that role
+ES_SIGN_REQUESTS = False
+
+# ES endpoints requests are spread across, "round_robin" or "least_in_flight".
+# An endpoint that fails to connect is skipped for ES_DEAD_BACKOFF seconds,
+# doubled on every consecutive failure up to ES_DEAD_BACKOFF_MAX. With
+# ES_SNIFF the other nodes of the cluster are discovered from the endpoints
+# (not available on AWS Elasticsearch).
+ES_ENDPOINTS = [ES_BASE_URL]
+ES_BALANCE = "round_robin"
+ES_DEAD_BACKOFF = 30
+ES_DEAD_BACKOFF_MAX = 600
+ES_SNIFF = False
+ES_SNIFF_INTERVAL = 300
+
+# Index the docs are written to - "daily" creates service-yyyy.mm.dd from the
+# date in the S3 key, "alias" writes to a service-write alias which is rolled
+# over to a new index once one of ROLLOVER_CONDITIONS is met. Each container
+# checks the conditions after ROLLOVER_CHECK_DOCS docs or ROLLOVER_CHECK_INTERVAL
+# seconds, whichever comes first.
+WRITE_MODE = "daily"
+ROLLOVER_CONDITIONS = {"max_size": "30gb", "max_docs": 100000000, "max_age": "30d"}
+ROLLOVER_CHECK_DOCS = 100000
+ROLLOVER_CHECK_INTERVAL = 300
+
+# Ingestion engine - "sync" indexes one file at a time, "async" overlaps s3
+# reads, parsing and bulk requests (needs aiohttp)
+ENGINE = "sync"
+ASYNC_QUEUE_SIZE = 4
+ASYNC_SENDERS = 4
+
+# Ceiling in bytes for the docs buffered between reading s3 and indexing.
+# When set, the sync engine streams each file and sends it in batches that
+# stay under it, and the async engine waits to read the next file until the
+# buffered ones fit (files too big to hold whole are streamed the same way as
+# the sync engine). None reads and sends whole files.
+MEMORY_CEILING = None
+
+# Record every bulk request (time, index, docs, bytes, duration, status) to
+# RECORD_FILE as gzipped json lines, keeping the payload of a sample of
+# RECORD_PAYLOAD_RATE of them, to replay later with bench/replay.py. Lambda
+# can only write under /tmp, which goes away with the container, so with
+# RECORD_BUCKET set the file is uploaded at the end of every invocation to
+# RECORD_PREFIX/<date>/<request id>.gz and removed.
+RECORD_FILE = None  # eg. "/tmp/es-stream-record.gz"
+RECORD_PAYLOAD_RATE = 0.0
+RECORD_BUCKET = None
+RECORD_PREFIX = "es-stream/records"
+
+# Per-service transforms applied to each doc before indexing, keyed on the
+# service prefix of the S3 key. Rules are applied in this order -
+#   "sample": {"field": "level", "rates": {"debug": 0.1}} - keep 10% of debug docs
+#   "drop": ["stack_trace", "request.body"] - remove (nested) fields
+#   "rename": {"msg": "message"} - move (nested) fields
+#   "flatten": True - {"a": {"b": 1}} becomes {"a.b": 1}
+#   "truncate": 1024 - cap the length of every string value
+TRANSFORMS = {}
+
+# Skip S3 objects that were already indexed (S3 and lambda retries deliver
+# the same object more than once), keyed on bucket, key and version or etag.
+# Indexed objects are kept in an in-process LRU of DEDUP_CACHE_SIZE entries
+# and, with DEDUP_STORE, in a persistent store shared across containers -
+# "dynamodb" (DEDUP_TABLE, items expire after DEDUP_TTL seconds) or "file"
+# (DEDUP_FILE, a local stand-in).
+DEDUP = False
+DEDUP_CACHE_SIZE = 10000
+DEDUP_STORE = None
+DEDUP_TABLE = "es-stream-ingested"
+DEDUP_TTL = 7 * 24 * 3600
+DEDUP_FILE = "/tmp/es-stream-ingested"
@@ -0,0 +1,138 @@
+# remembers the s3 objects already indexed, so redelivered events are skipped
+
+import threading
+import time
+from collections import OrderedDict
+
+import boto3
+import botocore
+from src.config import (
+    DEDUP,
+    DEDUP_CACHE_SIZE,
+    DEDUP_STORE,
+    DEDUP_TABLE,
+    DEDUP_TTL,
+    DEDUP_FILE,
+)
+
+_cache = OrderedDict()
+# the async engine checks and marks objects from executor threads
+_lock = threading.Lock()
+_file_ids = None
+
+
+def object_id(record):
+    """
+    bucket, key and version (or etag) of the object in an s3 event record.
+    None if the record has neither, such objects are never skipped.
+    """
+    try:
+        s3 = record["s3"]
+        bucket = s3["bucket"]["name"]
+        key = s3["object"]["key"]
+    except KeyError:
+        return None
+    version = s3["object"].get("versionId") or s3["object"].get("eTag")
+    if not version:
+        return None
+    return "{}/{}@{}".format(bucket, key, version)
+
+
+def cache_add(oid):
+    with _lock:
+        _cache[oid] = True
+        _cache.move_to_end(oid)
+        while len(_cache) > DEDUP_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def cache_seen(oid):
+    with _lock:
+        if oid in _cache:
+            _cache.move_to_end(oid)
+            return True
+    return False
+
+
+def dynamodb_seen(oid):
+    try:
+        client = boto3.client("dynamodb")
+        item = client.get_item(
+            TableName=DEDUP_TABLE, Key={"id": {"S": oid}}, ConsistentRead=True
+        )
+    except botocore.exceptions.ClientError as cerr:
+        print("error_message: {}".format(cerr.response["Error"]["Message"]))
+        return False
+    except botocore.exceptions.BotoCoreError as berr:
+        print("error_message: {}".format(berr))
+        return False
+    return "Item" in item
+
+
+def dynamodb_add(oid):
+    expires = int(time.time()) + DEDUP_TTL
+    try:
+        client = boto3.client("dynamodb")
+        client.put_item(
+            TableName=DEDUP_TABLE,
+            Item={"id": {"S": oid}, "expires": {"N": str(expires)}},
+        )
+    except botocore.exceptions.ClientError as cerr:
+        print("error_message: {}".format(cerr.response["Error"]["Message"]))
+    except botocore.exceptions.BotoCoreError as berr:
+        print("error_message: {}".format(berr))
+
+
+def file_ids():
+    global _file_ids
+    if _file_ids is None:
+        try:
+            with open(DEDUP_FILE) as f:
+                _file_ids = set(f.read().splitlines())
+        except FileNotFoundError:
+            _file_ids = set()
+        except OSError as oerr:
+            # not cached, so the file is tried again on the next check
+            print("error_message: {}".format(oerr))
+            return set()
+    return _file_ids
+
+
+def file_seen(oid):
+    with _lock:
+        return oid in file_ids()
+
+
+def file_add(oid):
+    with _lock:
+        file_ids().add(oid)
+        try:
+            with open(DEDUP_FILE, "a") as f:
+                f.write(oid + "\n")
+        except OSError as oerr:
+            print("error_message: {}".format(oerr))
+
+
+STORES = {
+    "dynamodb": (dynamodb_seen, dynamodb_add),
+    "file": (file_seen, file_add),
+}
+
+
+def is_ingested(oid):
+    if not DEDUP or oid is None:
+        return False
+    if cache_seen(oid):
+        return True
+    if DEDUP_STORE and STORES[DEDUP_STORE][0](oid):
+        cache_add(oid)
+        return True
+    return False
+
+
+def mark_ingested(oid):
+    if not DEDUP or oid is None:
+        return
+    cache_add(oid)
+    if DEDUP_STORE:
+        STORES[DEDUP_STORE][1](oid)
@@ -0,0 +1,272 @@
+# asyncio ingestion engine, overlaps s3 reads, parsing and bulk requests
+
+import asyncio
+import time
+from urllib.parse import unquote
+from src.helper import s3_get_object, CONNECTION_FAILED
+from src.es_stream import identify_index, prepare_bulk_doc, stream_index
+from src.sigv4 import sign_headers, get_credentials
+from src.transport import select, begin, end, reached
+from src.memory import AsyncGovernor
+from src.dedup import object_id, is_ingested, mark_ingested
+from src.rollover import alias_ready, maybe_rollover
+from src.recorder import record_bulk
+from src.config import ES_SIGN_REQUESTS, ASYNC_QUEUE_SIZE, ASYNC_SENDERS
+from src.config import MEMORY_CEILING, WRITE_MODE
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+HEADERS = {"Content-Type": "application/json"}
+
+# parsing holds the object, its lines and the joined bulk doc at the same time
+PARSE_FACTOR = 3
+
+# resolved once per run in the executor, botocore can block refreshing them
+_credentials = None
+
+
+async def es_request(session, method, url, data=None):
+    headers = None
+    if ES_SIGN_REQUESTS:
+        headers = sign_headers(method, url, data, credentials=_credentials)
+    try:
+        async with session.request(method, url, data=data, headers=headers) as r:
+            text = await r.text()
+    except aiohttp.ClientConnectorError as cerr:
+        print("{}_connection_error: {}".format(method.lower(), cerr))
+        return CONNECTION_FAILED
+    except asyncio.TimeoutError as terr:
+        # the request may have been applied, so it is not sent elsewhere
+        print("{}_timeout_error: {}".format(method.lower(), terr))
+    except aiohttp.ClientError as err:
+        print("{}_unknown_error: {}".format(method.lower(), err))
+    else:
+        return r.status, text
+    return None
+
+
+async def es_send(session, method, path, data=None):
+    # same failover as transport.send, for the async requests
+    for endpoint in select():
+        begin(endpoint)
+        try:
+            r = await es_request(session, method, endpoint + path, data=data)
+        finally:
+            end(endpoint)
+        if reached(endpoint, r):
+            return r
+    return None
+
+
+async def index_exists(session, index):
+    r = await es_send(session, "HEAD", "/" + index)
+    if r is None:
+        print("could not connect, cannot continue")
+        return False
+    return r[0] == 200
+
+
+async def create_index(session, index):
+    r = await es_send(session, "PUT", "/" + index)
+    if r is None:
+        print("could not connect, cannot continue")
+        return False
+    elif r[0] == 200:
+        return True
+    else:
+        print("error creating index")
+        return False
+
+
+async def ensure_index(session, index):
+    if WRITE_MODE == "alias":
+        # rare, once per alias and container, so the sync version will do
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, alias_ready, index)
+    if await index_exists(session, index):
+        return True
+    return await create_index(session, index)
+
+
+async def bulk_index(session, index, bulk_doc):
+    path = "/" + index + "/_doc/_bulk"
+    started, clock = time.time(), time.perf_counter()
+    # encoded once here, the signer and aiohttp would each copy a str
+    r = await es_send(session, "POST", path, data=bulk_doc.encode("utf-8"))
+    status = None if r is None else r[0]
+    loop = asyncio.get_event_loop()
+    duration = time.perf_counter() - clock
+    await loop.run_in_executor(
+        None, record_bulk, index, bulk_doc, started, duration, status
+    )
+    if r is None:
+        print("could not connect, cannot continue")
+        return False
+    elif r[0] != 200:
+        print("docs not indexed " + r[1])
+        return False
+    else:
+        print(r[1])
+        if WRITE_MODE == "alias":
+            docs = bulk_doc.count("\n") // 2
+            await loop.run_in_executor(None, maybe_rollover, index, docs)
+        return True
+
+
+async def fetch_stage(records, parse_queue, parsers, governor):
+    loop = asyncio.get_event_loop()
+    try:
+        for record in records:
+            try:
+                bucket = record["s3"]["bucket"]["name"]
+                key = unquote(record["s3"]["object"]["key"])
+            except KeyError as kerr:
+                print("key error ", kerr)
+                return False
+
+            oid = object_id(record)
+            # the store may be dynamodb or a file, keep it off the event loop
+            if await loop.run_in_executor(None, is_ingested, oid):
+                print("already indexed, skipping " + key)
+                continue
+
+            size = record["s3"]["object"].get("size")
+            if MEMORY_CEILING and (
+                size is None or size * PARSE_FACTOR > MEMORY_CEILING
+            ):
+                # too big to hold whole, stream it in batches like the sync
+                # engine does, once the files already buffered are sent
+                await governor.acquire("read", MEMORY_CEILING)
+                ok = await loop.run_in_executor(None, stream_index, bucket, key)
+                await governor.free("read", MEMORY_CEILING)
+                if not ok:
+                    return False
+                await loop.run_in_executor(None, mark_ingested, oid)
+                continue
+
+            # wait for the files already buffered to be sent before reading
+            size = (size or 0) * PARSE_FACTOR
+            await governor.acquire("read", size)
+            obj = await loop.run_in_executor(None, s3_get_object, bucket, key)
+            if obj is None:
+                await governor.free("read", size)
+                print("unable to read s3 file, cannot continue")
+                return False
+            governor.release("read", size)
+            governor.reserve("read", len(obj) * PARSE_FACTOR)
+            await parse_queue.put((oid, key, obj))
+        return True
+    finally:
+        for _ in range(parsers):
+            await parse_queue.put(None)
+
+
+async def parse_stage(parse_queue, send_queue, governor):
+    loop = asyncio.get_event_loop()
+    ok = True
+    while True:
+        item = await parse_queue.get()
+        if item is None:
+            return ok
+        oid, key, obj = item
+        size = len(obj) * PARSE_FACTOR
+        index = identify_index(key)
+        docs = obj.splitlines()
+        del obj
+        print("docs_to_index: " + str(len(docs)))
+        if not index or not docs:
+            await governor.free("read", size)
+            ok = False
+            continue
+
+        bulk_doc = await loop.run_in_executor(
+            None, prepare_bulk_doc, docs, key.split("/")[0]
+        )
+        del docs
+        if bulk_doc:
+            governor.reserve("parse", len(bulk_doc))
+        await governor.free("read", size)
+        if bulk_doc == "":
+            await loop.run_in_executor(None, mark_ingested, oid)
+            continue
+        elif not bulk_doc:
+            ok = False
+            continue
+        await send_queue.put((oid, index, bulk_doc))
+
+
+async def send_doc(session, index, bulk_doc, indices):
+    # senders share one check per index instead of racing to create it
+    if index not in indices:
+        indices[index] = asyncio.ensure_future(ensure_index(session, index))
+    if not await indices[index]:
+        print("cannot continue")
+        return False
+
+    if not await bulk_index(session, index, bulk_doc):
+        print("bulk index error")
+        return False
+    return True
+
+
+async def send_stage(session, send_queue, indices, governor):
+    loop = asyncio.get_event_loop()
+    ok = True
+    while True:
+        item = await send_queue.get()
+        if item is None:
+            return ok
+        oid, index, bulk_doc = item
+        # the doc and the encoded copy bulk_index sends
+        size = 2 * len(bulk_doc)
+        governor.release("parse", len(bulk_doc))
+        governor.reserve("send", size)
+        if await send_doc(session, index, bulk_doc, indices):
+            await loop.run_in_executor(None, mark_ingested, oid)
+        else:
+            ok = False
+        await governor.free("send", size)
+
+
+async def es_init_async(records):
+    """
+    fetch, parse and send run as separate stages joined by bounded queues,
+    so the next s3 object is read while earlier bulk requests are in flight.
+    a failed record does not stop the others, the result is False if any failed.
+    """
+    global _credentials
+    if ES_SIGN_REQUESTS:
+        loop = asyncio.get_event_loop()
+        _credentials = await loop.run_in_executor(None, get_credentials)
+
+    governor = AsyncGovernor(MEMORY_CEILING or float("inf"))
+    parse_queue = asyncio.Queue(maxsize=ASYNC_QUEUE_SIZE)
+    send_queue = asyncio.Queue(maxsize=ASYNC_QUEUE_SIZE)
+    indices = {}
+
+    timeout = aiohttp.ClientTimeout(total=10)
+    async with aiohttp.ClientSession(headers=HEADERS, timeout=timeout) as session:
+        senders = [
+            asyncio.ensure_future(send_stage(session, send_queue, indices, governor))
+            for _ in range(ASYNC_SENDERS)
+        ]
+        fetched, parsed = await asyncio.gather(
+            fetch_stage(records, parse_queue, 1, governor),
+            parse_stage(parse_queue, send_queue, governor),
+        )
+        for _ in senders:
+            await send_queue.put(None)
+        sent = await asyncio.gather(*senders)
+
+    print("peak_buffered_bytes: {}".format(governor.peak))
+    return fetched and parsed and all(sent)
+
+
+def es_init(records):
+    if aiohttp is None:
+        print("aiohttp not installed, cannot continue")
+        return False
+    return asyncio.run(es_init_async(records))
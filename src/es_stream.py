@@ -1,13 +1,21 @@
 import json
+import time
 from urllib.parse import unquote
-from src.helper import s3_get_object, post_request, head_request, put_request
-from src.config import ES_BASE_URL
+from src.helper import s3_get_object, s3_stream_lines
+from src.helper import post_request, head_request, put_request
+from src.memory import Governor
+from src.dedup import object_id, is_ingested, mark_ingested
+from src.rollover import write_alias, alias_ready, maybe_rollover
+from src.recorder import record_bulk, upload
+from src.sigv4 import es_auth
+from src.transport import send
+from src.transform import transform_doc
+from src.config import ENGINE, MEMORY_CEILING, TRANSFORMS, WRITE_MODE
 
 
 def index_exists(index):
-    index_url = ES_BASE_URL + "/" + index
     headers = {"Content-Type": "application/json"}
-    r = head_request(url=index_url, headers=headers)
+    r = send(head_request, "/" + index, headers=headers, auth=es_auth())
     if r is None:
         print("could not connect, cannot continue")
         return False
@@ -19,9 +27,8 @@ def index_exists(index):
 
 
 def create_index(index):
-    index_url = ES_BASE_URL + "/" + index
     headers = {"Content-Type": "application/json"}
-    r = put_request(url=index_url, headers=headers)
+    r = send(put_request, "/" + index, headers=headers, auth=es_auth())
     if r is None:
         print("could not connect, cannot continue")
         return False
@@ -33,9 +40,21 @@ def create_index(index):
 
 
 def bulk_index(index, bulk_doc):
-    url = ES_BASE_URL + "/" + index + "/_doc/_bulk"
+    path = "/" + index + "/_doc/_bulk"
     headers = {"Content-Type": "application/json"}
-    r = post_request(url=url, data=bulk_doc, headers=headers)
+    started, clock = time.time(), time.perf_counter()
+    # encoded once here, the signer and http.client would each copy a str
+    data = bulk_doc.encode("utf-8")
+    r = send(
+        post_request,
+        path,
+        return_errors=True,
+        data=data,
+        headers=headers,
+        auth=es_auth(),
+    )
+    status = None if r is None else r.status_code
+    record_bulk(index, bulk_doc, started, time.perf_counter() - clock, status)
     if r is None:
         print("could not connect, cannot continue")
         return False
@@ -44,12 +63,25 @@ def bulk_index(index, bulk_doc):
         return False
     else:
         print(r.text)
+        if WRITE_MODE == "alias":
+            maybe_rollover(index, bulk_doc.count("\n") // 2)
         return True
 
 
+def index_ready(index):
+    if WRITE_MODE == "alias":
+        return alias_ready(index)
+    if not index_exists(index):
+        if not create_index(index):
+            return False
+    return True
+
+
 def identify_index(key):
     index_pattern = key.split("/")[0]
-    if index_pattern == "serviceA":
+    if index_pattern == "serviceA" and WRITE_MODE == "alias":
+        return write_alias(index_pattern)
+    elif index_pattern == "serviceA":
         index = "{}-{}".format(
             index_pattern, key.split("/")[1].split("T")[0].replace("-", ".")
         )
@@ -58,22 +90,119 @@ def identify_index(key):
         return False
 
 
-def prepare_bulk_doc(docs):
-    bulk_doc = """"""
+def bulk_line(doc, rules=None):
+    """
+    the meta and doc lines for one doc. None if the doc is not valid json,
+    an empty string if a transform filtered it out.
+    """
     meta = """{"index":{}}"""
+    try:
+        jdoc = json.loads(doc)
+    except json.JSONDecodeError as jerr:
+        print("{} : json_decode_error {}".format(doc, jerr))
+        return None
+    if rules:
+        jdoc = transform_doc(jdoc, rules)
+        if jdoc is None:
+            return ""
+    return """{}\n{}\n""".format(meta, json.dumps(jdoc))
+
+
+def prepare_bulk_doc(docs, service=None):
+    """
+    returns the bulk doc, False if no doc is valid json, or an empty string
+    if every valid doc was filtered out by the service transforms
+    """
+    bulk_lines = []
+    rules = TRANSFORMS.get(service)
     for doc in docs:
-        try:
-            jdoc = json.loads(doc)
-        except json.JSONDecodeError as jerr:
-            print("{} : json_decode_error {}".format(doc, jerr))
+        line = bulk_line(doc, rules)
+        if line is not None:
+            bulk_lines.append(line)
+
+    if not bulk_lines:
+        print("no valid json record to index")
+        return False
+
+    bulk_doc = "".join(bulk_lines)
+    if not bulk_doc:
+        print("all docs filtered out, nothing to index")
+    return bulk_doc
+
+
+def bulk_batches(lines, service, governor, stats):
+    """
+    yields bulk docs built from lines. once the batch parsed so far, with
+    room to join it, would no longer fit under the governor ceiling it is
+    yielded to be sent before more lines are read. the buffered bytes stay
+    under the ceiling plus the size of one doc. stats["parsed"] counts the
+    valid docs, including those filtered out.
+    """
+    rules = TRANSFORMS.get(service)
+    batch = []
+    for line in lines:
+        governor.reserve("read", len(line))
+        bulk = bulk_line(line, rules)
+        governor.release("read", len(line))
+        if bulk is None:
             continue
-        bulk_doc = bulk_doc + """{}\n{}\n""".format(meta, json.dumps(jdoc))
+        stats["parsed"] += 1
+        if not bulk:
+            continue
+
+        governor.reserve("parse", len(bulk))
+        # joining the batch to send it takes as much again
+        if batch and not governor.fits(governor.buffered["parse"]):
+            yield from send_batch(batch, governor)
+        batch.append(bulk)
 
-    if bulk_doc == """""":
+    if batch:
+        yield from send_batch(batch, governor)
+
+
+def send_batch(batch, governor):
+    bulk_doc = "".join(batch)
+    governor.reserve("send", len(bulk_doc))
+    governor.release("parse", len(bulk_doc))
+    batch.clear()
+    # bulk_index sends an encoded copy of the batch
+    governor.reserve("send", len(bulk_doc))
+    yield bulk_doc
+    governor.release("send", 2 * len(bulk_doc))
+
+
+def stream_index(bucket, key):
+    index = identify_index(key)
+    if not index:
+        return False
+
+    lines = s3_stream_lines(bucket, key)
+    if lines is None:
+        print("unable to read s3 file, cannot continue")
+        return False
+
+    governor = Governor(MEMORY_CEILING)
+    stats = {"parsed": 0}
+    batches = 0
+    for bulk_doc in bulk_batches(lines, key.split("/")[0], governor, stats):
+        if batches == 0 and not index_ready(index):
+            print("cannot continue")
+            return False
+        batches += 1
+        if not bulk_index(index, bulk_doc):
+            print("bulk index error")
+            return False
+        # the loop variable would keep this batch alive, uncounted, until
+        # the next one is yielded
+        del bulk_doc
+
+    print("batches: {} peak_buffered_bytes: {}".format(batches, governor.peak))
+    if stats["parsed"] == 0:
         print("no valid json record to index")
         return False
-    else:
-        return bulk_doc
+    elif batches == 0:
+        print("all docs filtered out, nothing to index")
+    return True
 
 
 def get_docs(bucket, key):
@@ -96,24 +225,38 @@ def es_init(records):
             print("key error ", kerr)
             return False
 
+        oid = object_id(record)
+        if is_ingested(oid):
+            print("already indexed, skipping " + key)
+            continue
+
+        if MEMORY_CEILING:
+            if not stream_index(bucket, key):
+                return False
+            mark_ingested(oid)
+            continue
+
         docs = get_docs(bucket, key)
         index = identify_index(key)
 
         if not index or not docs:
             return False
 
-        bulk_docs = prepare_bulk_doc(docs)
-        if not bulk_docs:
+        bulk_docs = prepare_bulk_doc(docs, key.split("/")[0])
+        if bulk_docs == "":
+            mark_ingested(oid)
+            continue
+        elif not bulk_docs:
             return False
 
-        if not index_exists(index):
-            if not create_index(index):
-                print("cannot continue")
-                return False
+        if not index_ready(index):
+            print("cannot continue")
+            return False
 
         if not bulk_index(index, bulk_docs):
             print("bulk index error")
             return False
+        mark_ingested(oid)
 
     return True
 
@@ -125,7 +268,15 @@ def main(event, context):
         print("type error:", terr)
         return False
     else:
-        if es_init(records):
+        if ENGINE == "async":
+            # imported here, es_async builds on the functions in this module
+            from src import es_async
+
+            ok = es_async.es_init(records)
+        else:
+            ok = es_init(records)
+        upload(getattr(context, "aws_request_id", None))
+        if ok:
             return True
         else:
             return False
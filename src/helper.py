@@ -4,6 +4,11 @@ import boto3
 import botocore
 import requests
 
+# returned by the request helpers when the request never reached the url
+# (connection refused, dns, connect timeout), as opposed to None for any other
+# error. a read timeout is None, the request may have been applied already
+CONNECTION_FAILED = object()
+
 
 def s3_get_object(bucket, key):
     try:
@@ -18,6 +23,32 @@ def s3_get_object(bucket, key):
         return s3file
 
 
+def s3_stream_lines(bucket, key, chunk_size=65536):
+    try:
+        s3client = boto3.client("s3")
+        data = s3client.get_object(Bucket=bucket, Key=key)
+    except botocore.exceptions.ClientError as cerr:
+        print("error_message: {}".format(cerr.response["Error"]["Message"]))
+        return None
+    else:
+        lines = data["Body"].iter_lines(chunk_size=chunk_size)
+        return (line.decode("utf-8") for line in lines)
+
+
+def s3_upload_file(path, bucket, key):
+    try:
+        s3client = boto3.client("s3")
+        s3client.upload_file(path, bucket, key)
+    except (
+        botocore.exceptions.ClientError,
+        botocore.exceptions.BotoCoreError,
+        boto3.exceptions.S3UploadFailedError,
+    ) as err:
+        print("error_message: {}".format(err))
+        return False
+    return True
+
+
 def bad_request():
     return {
         "statusCode": 400,
@@ -34,14 +65,17 @@ def accepted_request(body):
     }
 
 
-def post_request(url, **kwargs):
+def post_request(url, return_errors=False, **kwargs):
     try:
         r = requests.post(url, **kwargs, timeout=10)
         r.raise_for_status()
     except requests.exceptions.HTTPError as h:
         print("post_http_error: {}".format(h))
+        if return_errors:
+            return h.response
     except requests.exceptions.ConnectionError as c:
         print("post_connection_error: {}".format(c))
+        return CONNECTION_FAILED
     except requests.exceptions.Timeout as t:
         print("post_timeout_error: {}".format(t))
     except Exception as err:
@@ -51,14 +85,15 @@ def post_request(url, **kwargs):
     return None
 
 
-def head_request(url, headers):
+def head_request(url, headers, auth=None):
     try:
-        r = requests.head(url, headers=headers, timeout=10)
+        r = requests.head(url, headers=headers, auth=auth, timeout=10)
         r.raise_for_status()
     except requests.exceptions.HTTPError as h:
         print("head_http_error: {}".format(h))
     except requests.exceptions.ConnectionError as c:
         print("head_connection_error: {}".format(c))
+        return CONNECTION_FAILED
     except requests.exceptions.Timeout as t:
         print("head_timeout_error: {}".format(t))
     except Exception as err:
@@ -68,14 +103,15 @@ def head_request(url, headers):
     return None
 
 
-def put_request(url, headers):
+def put_request(url, headers, auth=None, data=None):
     try:
-        r = requests.put(url, headers=headers, timeout=10)
+        r = requests.put(url, headers=headers, auth=auth, data=data, timeout=10)
         r.raise_for_status()
     except requests.exceptions.HTTPError as h:
         print("put_http_error: {}".format(h))
     except requests.exceptions.ConnectionError as c:
         print("put_connection_error: {}".format(c))
+        return CONNECTION_FAILED
     except requests.exceptions.Timeout as t:
         print("put_timeout_error: {}".format(t))
     except Exception as err:
@@ -0,0 +1,54 @@
+# tracks the bytes buffered while ingesting, to stay under a memory ceiling
+
+import asyncio
+
+STAGES = ("read", "parse", "send")
+
+
+class Governor:
+    """
+    counts the bytes each stage holds. reading should wait (or the buffered
+    docs be sent) once fits() is False, so the total stays under the ceiling.
+    """
+
+    def __init__(self, ceiling):
+        self.ceiling = ceiling
+        self.buffered = dict.fromkeys(STAGES, 0)
+        self.peak = 0
+
+    def total(self):
+        return sum(self.buffered.values())
+
+    def fits(self, size):
+        # an empty pipeline always takes the next item, so a single doc
+        # larger than the ceiling still gets through
+        total = self.total()
+        return total == 0 or total + size <= self.ceiling
+
+    def reserve(self, stage, size):
+        self.buffered[stage] += size
+        self.peak = max(self.peak, self.total())
+
+    def release(self, stage, size):
+        self.buffered[stage] = max(self.buffered[stage] - size, 0)
+
+
+class AsyncGovernor(Governor):
+    """
+    governor shared by the async stages, acquire waits until the size fits.
+    must be created inside the running event loop.
+    """
+
+    def __init__(self, ceiling):
+        super().__init__(ceiling)
+        self.changed = asyncio.Condition()
+
+    async def acquire(self, stage, size):
+        async with self.changed:
+            await self.changed.wait_for(lambda: self.fits(size))
+            self.reserve(stage, size)
+
+    async def free(self, stage, size):
+        self.release(stage, size)
+        async with self.changed:
+            self.changed.notify_all()
@@ -0,0 +1,75 @@
+# records bulk requests, for replaying the same load against another cluster
+
+import gzip
+import json
+import os
+import random
+import time
+import uuid
+
+from src.helper import s3_upload_file
+from src.config import RECORD_FILE, RECORD_PAYLOAD_RATE, RECORD_BUCKET, RECORD_PREFIX
+
+
+def record_bulk(index, bulk_doc, started, duration, status):
+    """
+    appends one bulk request to RECORD_FILE, a no-op unless it is set.
+    started is the wall clock time the request was sent, duration in seconds,
+    status the http status or None if no endpoint answered.
+    """
+    if not RECORD_FILE:
+        return
+    entry = {
+        "t": round(started, 6),
+        "index": index,
+        "docs": bulk_doc.count("\n") // 2,
+        # json.dumps escapes non ascii, so chars are bytes
+        "bytes": len(bulk_doc),
+        "duration": round(duration, 6),
+        "status": status,
+    }
+    if RECORD_PAYLOAD_RATE and random.random() < RECORD_PAYLOAD_RATE:
+        entry["payload"] = bulk_doc
+
+    # each entry is a complete gzip member, so the file stays readable
+    # whenever the lambda container is frozen or dropped
+    line = json.dumps(entry, separators=(",", ":")) + "\n"
+    try:
+        with gzip.open(RECORD_FILE, "ab") as f:
+            f.write(line.encode("utf-8"))
+    except Exception as err:
+        # the bulk request already went through, recording must not fail it
+        print("record_error: {}".format(err))
+
+
+def upload(name=None):
+    """
+    ships RECORD_FILE to RECORD_BUCKET and removes it, a no-op unless both
+    are set. name (the lambda request id) keeps the keys of invocations apart.
+    the file is kept to try again next time if the upload fails.
+    """
+    if not RECORD_FILE or not RECORD_BUCKET or not os.path.exists(RECORD_FILE):
+        return False
+    key = "{}/{}/{}.gz".format(
+        RECORD_PREFIX.rstrip("/"),
+        time.strftime("%Y/%m/%d", time.gmtime()),
+        name or uuid.uuid4().hex,
+    )
+    if not s3_upload_file(RECORD_FILE, RECORD_BUCKET, key):
+        print("record_upload_error: kept " + RECORD_FILE)
+        return False
+    try:
+        os.remove(RECORD_FILE)
+    except OSError as oerr:
+        print("record_error: {}".format(oerr))
+    print("recorded to s3://{}/{}".format(RECORD_BUCKET, key))
+    return True
+
+
+def load(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                yield json.loads(line)
+        except EOFError:
+            print("record file truncated, stopped at the last complete entry")
@@ -0,0 +1,81 @@
+# writes through a rollover alias per service instead of daily indices
+
+import json
+import time
+
+from src.helper import post_request, head_request, put_request
+from src.sigv4 import es_auth
+from src.transport import send
+from src.config import (
+    ROLLOVER_CONDITIONS,
+    ROLLOVER_CHECK_DOCS,
+    ROLLOVER_CHECK_INTERVAL,
+)
+
+HEADERS = {"Content-Type": "application/json"}
+
+# aliases known to exist, and alias -> [docs since last check, time of check]
+_aliases = set()
+_checks = {}
+
+
+def write_alias(service):
+    return "{}-write".format(service)
+
+
+def alias_exists(alias):
+    r = send(head_request, "/_alias/" + alias, headers=HEADERS, auth=es_auth())
+    return r is not None and r.status_code == 200
+
+
+def alias_ready(alias):
+    """
+    makes sure the alias exists, creating its first index if needed. only
+    the first call for an alias in a container goes to the cluster.
+    """
+    if alias in _aliases:
+        return True
+
+    if not alias_exists(alias):
+        first_index = alias[: -len("-write")] + "-000001"
+        body = json.dumps({"aliases": {alias: {"is_write_index": True}}})
+        path = "/" + first_index
+        r = send(put_request, path, headers=HEADERS, auth=es_auth(), data=body)
+        # an http error is None too, so check again in case another
+        # container created the index first
+        if r is None and not alias_exists(alias):
+            print("error creating index " + first_index)
+            return False
+
+    _aliases.add(alias)
+    return True
+
+
+def maybe_rollover(alias, docs):
+    """
+    counts docs written to the alias, and asks the cluster to roll it over
+    when enough docs or time have passed since the last check
+    """
+    # the first write to an alias in a container always checks
+    check = _checks.setdefault(alias, [0, None])
+    check[0] += docs
+    now = time.monotonic()
+    if check[1] is not None and (
+        check[0] < ROLLOVER_CHECK_DOCS and now - check[1] < ROLLOVER_CHECK_INTERVAL
+    ):
+        return False
+
+    _checks[alias] = [0, now]
+    body = json.dumps({"conditions": ROLLOVER_CONDITIONS})
+    path = "/" + alias + "/_rollover"
+    r = send(post_request, path, data=body, headers=HEADERS, auth=es_auth())
+    if r is None:
+        print("rollover check failed")
+        return False
+    try:
+        rolled_over = r.json().get("rolled_over", False)
+    except ValueError:
+        rolled_over = False
+    if rolled_over:
+        print("rolled over {} to {}".format(alias, r.json().get("new_index")))
+    return rolled_over
@@ -0,0 +1,122 @@
+# signs es requests with aws sigv4, credentials and signing keys are cached
+
+import datetime
+import hashlib
+import hmac
+from urllib.parse import quote, urlsplit
+
+import boto3
+import requests
+from src.config import REGION, ES_SIGN_REQUESTS
+
+SERVICE = "es"
+
+_credentials = None
+_signing_keys = {}
+
+
+def get_credentials():
+    """
+    resolves the credential chain once per container. botocore refreshes
+    temporary credentials itself when they are close to expiry, static ones
+    (lambda environment variables) are returned as is.
+    """
+    global _credentials
+    if _credentials is None:
+        _credentials = boto3.Session().get_credentials()
+    return _credentials.get_frozen_credentials()
+
+
+def _hmac(key, msg):
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+
+def signing_key(secret_key, date, region, service):
+    # the derived key only changes with the date or the credentials
+    cache_key = (secret_key, date, region, service)
+    if cache_key not in _signing_keys:
+        _signing_keys.clear()
+        key = _hmac(("AWS4" + secret_key).encode("utf-8"), date)
+        key = _hmac(key, region)
+        key = _hmac(key, service)
+        _signing_keys[cache_key] = _hmac(key, "aws4_request")
+    return _signing_keys[cache_key]
+
+
+def canonical_query(query):
+    pairs = []
+    for pair in query.split("&") if query else []:
+        key, _, value = pair.partition("=")
+        pairs.append((quote(key, safe="-_.~%"), quote(value, safe="-_.~%")))
+    return "&".join("{}={}".format(k, v) for k, v in sorted(pairs))
+
+
+def sign_headers(
+    method, url, body=None, credentials=None, now=None, region=REGION, service=SERVICE
+):
+    """
+    returns the headers to add to the request - x-amz-date, the session
+    token for temporary credentials, and the authorization header
+    """
+    credentials = credentials or get_credentials()
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    date = amz_date[:8]
+
+    if body is None:
+        body = b""
+    elif isinstance(body, str):
+        body = body.encode("utf-8")
+
+    parts = urlsplit(url)
+    headers = {"host": parts.netloc, "x-amz-date": amz_date}
+    if credentials.token:
+        headers["x-amz-security-token"] = credentials.token
+    signed_headers = ";".join(sorted(headers))
+
+    canonical_request = "\n".join(
+        [
+            method.upper(),
+            quote(parts.path or "/", safe="/-_.~"),
+            canonical_query(parts.query),
+            "".join("{}:{}\n".format(k, headers[k]) for k in sorted(headers)),
+            signed_headers,
+            hashlib.sha256(body).hexdigest(),
+        ]
+    )
+    scope = "{}/{}/{}/aws4_request".format(date, region, service)
+    string_to_sign = "\n".join(
+        [
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+        ]
+    )
+    key = signing_key(credentials.secret_key, date, region, service)
+    signature = hmac.new(
+        key, string_to_sign.encode("utf-8"), hashlib.sha256
+    ).hexdigest()
+
+    del headers["host"]
+    headers["Authorization"] = (
+        "AWS4-HMAC-SHA256 Credential={}/{}, SignedHeaders={}, Signature={}".format(
+            credentials.access_key, scope, signed_headers, signature
+        )
+    )
+    return headers
+
+
+class SigV4Auth(requests.auth.AuthBase):
+    def __call__(self, r):
+        r.headers.update(sign_headers(r.method, r.url, r.body))
+        return r
+
+
+_auth = SigV4Auth()
+
+
+def es_auth():
+    if ES_SIGN_REQUESTS:
+        return _auth
+    return None
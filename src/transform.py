@@ -0,0 +1,95 @@
+# per-service transforms applied to each doc before indexing
+
+import random
+
+
+def get_path(doc, path):
+    node = doc
+    for part in path.split("."):
+        if not isinstance(node, dict) or part not in node:
+            return None
+        node = node[part]
+    return node
+
+
+def pop_path(doc, path):
+    parts = path.split(".")
+    node = doc
+    for part in parts[:-1]:
+        if not isinstance(node, dict) or part not in node:
+            return False, None
+        node = node[part]
+    if not isinstance(node, dict) or parts[-1] not in node:
+        return False, None
+    return True, node.pop(parts[-1])
+
+
+def set_path(doc, path, value):
+    parts = path.split(".")
+    node = doc
+    for part in parts[:-1]:
+        if not isinstance(node.get(part), dict):
+            node[part] = {}
+        node = node[part]
+    node[parts[-1]] = value
+
+
+def flatten(doc, prefix=""):
+    flat = {}
+    for key, value in doc.items():
+        name = prefix + key
+        if isinstance(value, dict) and value:
+            flat.update(flatten(value, name + "."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def truncate(value, max_length):
+    if isinstance(value, str):
+        return value[:max_length]
+    elif isinstance(value, dict):
+        return {k: truncate(v, max_length) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [truncate(v, max_length) for v in value]
+    else:
+        return value
+
+
+def keep_sampled(doc, sample):
+    level = get_path(doc, sample.get("field", "level"))
+    if not isinstance(level, str):
+        return True
+    rate = sample.get("rates", {}).get(level.lower())
+    if rate is None:
+        return True
+    return random.random() < rate
+
+
+def transform_doc(doc, rules):
+    """
+    applies the service rules to a parsed doc, in the order
+    sample, drop, rename, flatten, truncate.
+    returns None if the doc is sampled out.
+    """
+    if not isinstance(doc, dict):
+        return doc
+
+    if "sample" in rules and not keep_sampled(doc, rules["sample"]):
+        return None
+
+    for path in rules.get("drop", []):
+        pop_path(doc, path)
+
+    for old, new in rules.get("rename", {}).items():
+        found, value = pop_path(doc, old)
+        if found:
+            set_path(doc, new, value)
+
+    if rules.get("flatten"):
+        doc = flatten(doc)
+
+    if rules.get("truncate"):
+        doc = truncate(doc, rules["truncate"])
+
+    return doc
@@ -0,0 +1,157 @@
+# spreads es requests across endpoints and fails over from dead ones
+
+import itertools
+import threading
+import time
+
+import requests
+from src.helper import CONNECTION_FAILED
+from src.sigv4 import es_auth
+from src.config import (
+    ES_ENDPOINTS,
+    ES_BALANCE,
+    ES_DEAD_BACKOFF,
+    ES_DEAD_BACKOFF_MAX,
+    ES_SNIFF,
+    ES_SNIFF_INTERVAL,
+)
+
+# endpoint -> {"in_flight": int, "failures": int, "dead_until": float}
+_nodes = {}
+# the async engine sends from the event loop and executor threads at once
+_lock = threading.Lock()
+_counter = itertools.count()
+# None until the first sniff, monotonic time counts from boot so 0 is not "long ago"
+_last_sniff = None
+
+
+def add_endpoint(endpoint):
+    endpoint = endpoint.rstrip("/")
+    with _lock:
+        if endpoint not in _nodes:
+            _nodes[endpoint] = {"in_flight": 0, "failures": 0, "dead_until": 0.0}
+    return endpoint
+
+
+def node_for(url):
+    for endpoint in _nodes:
+        if url == endpoint or url.startswith(endpoint + "/"):
+            return endpoint
+    return None
+
+
+def mark_dead(url):
+    with _lock:
+        endpoint = node_for(url)
+        if endpoint is None:
+            return
+        node = _nodes[endpoint]
+        backoff = min(ES_DEAD_BACKOFF * 2 ** node["failures"], ES_DEAD_BACKOFF_MAX)
+        node["failures"] += 1
+        node["dead_until"] = time.monotonic() + backoff
+    print("endpoint_dead: {} for {}s".format(endpoint, backoff))
+
+
+def mark_alive(endpoint):
+    with _lock:
+        node = _nodes[endpoint]
+        node["failures"] = 0
+        node["dead_until"] = 0.0
+
+
+def sniff():
+    """
+    adds the http address of every node in the cluster, asking the first
+    endpoint that answers. the scheme of the configured endpoints is kept.
+    """
+    global _last_sniff
+    _last_sniff = time.monotonic()
+    with _lock:
+        endpoints = list(_nodes)
+    for endpoint in endpoints:
+        try:
+            r = requests.get(endpoint + "/_nodes/http", auth=es_auth(), timeout=10)
+            r.raise_for_status()
+            nodes = r.json()["nodes"]
+        except Exception as err:
+            print("sniff_error: {}".format(err))
+            continue
+        scheme = endpoint.split("://")[0]
+        for node in nodes.values():
+            try:
+                address = node["http"]["publish_address"]
+            except KeyError:
+                continue
+            # publish_address is either "ip:port" or "hostname/ip:port"
+            add_endpoint("{}://{}".format(scheme, address.split("/")[-1]))
+        return True
+    return False
+
+
+def select():
+    """
+    returns the endpoints in the order they should be tried. live endpoints
+    come first, by round robin or by fewest requests in flight, then dead
+    ones by how soon they are due to be retried.
+    """
+    if ES_SNIFF and (
+        _last_sniff is None or time.monotonic() - _last_sniff > ES_SNIFF_INTERVAL
+    ):
+        sniff()
+
+    now = time.monotonic()
+    with _lock:
+        endpoints = list(_nodes)
+        start = next(_counter) % len(endpoints)
+        endpoints = endpoints[start:] + endpoints[:start]
+
+        alive = [e for e in endpoints if _nodes[e]["dead_until"] <= now]
+        dead = [e for e in endpoints if _nodes[e]["dead_until"] > now]
+        if ES_BALANCE == "least_in_flight":
+            alive.sort(key=lambda e: _nodes[e]["in_flight"])
+        dead.sort(key=lambda e: _nodes[e]["dead_until"])
+    return alive + dead
+
+
+def begin(endpoint):
+    with _lock:
+        _nodes[endpoint]["in_flight"] += 1
+
+
+def end(endpoint):
+    with _lock:
+        _nodes[endpoint]["in_flight"] -= 1
+
+
+def reached(endpoint, r):
+    """
+    returns True if the request reached the endpoint, otherwise marks it dead.
+    decided from this request's own result, so a concurrent request failing
+    on the same endpoint does not affect it.
+    """
+    if r is CONNECTION_FAILED:
+        mark_dead(endpoint)
+        return False
+    mark_alive(endpoint)
+    return True
+
+
+def send(request, path, **kwargs):
+    """
+    calls request (one of the helper request functions) with the url of each
+    endpoint in turn until one does not fail to connect. any other result
+    (an http error included) is returned as is, None if no endpoint answered.
+    """
+    for endpoint in select():
+        begin(endpoint)
+        try:
+            r = request(url=endpoint + path, **kwargs)
+        finally:
+            end(endpoint)
+        if reached(endpoint, r):
+            return r
+    return None
+
+
+for _endpoint in ES_ENDPOINTS:
+    add_endpoint(_endpoint)
@@ -0,0 +1,205 @@
+import json
+import mock
+from collections import OrderedDict
+from pathlib import Path
+
+from .context import src
+import src.dedup
+import src.es_async
+
+RESOURCES = Path("tests/resources/")
+
+
+def valid_record():
+    return json.loads((RESOURCES / "valid_event.json").read_text())["Records"][0]
+
+
+"""
+object_id tests
+
+"""
+
+
+def test_object_id_etag():
+    assert src.dedup.object_id(valid_record()) == (
+        "S3bucket/serviceA/2020-01-01/log001@02ce65237-1"
+    )
+
+
+def test_object_id_version_preferred():
+    record = valid_record()
+    record["s3"]["object"]["versionId"] = "v2"
+    assert src.dedup.object_id(record).endswith("@v2")
+
+
+def test_object_id_none():
+    record = valid_record()
+    del record["s3"]["object"]["eTag"]
+    assert src.dedup.object_id(record) is None
+    invalid_records = json.loads((RESOURCES / "invalid_event.json").read_text())
+    assert src.dedup.object_id(invalid_records["Records"][0]) is None
+
+
+"""
+is_ingested / mark_ingested tests
+
+"""
+
+
+@mock.patch("src.dedup.DEDUP", False)
+@mock.patch("src.dedup._cache", OrderedDict())
+def test_dedup_disabled():
+    src.dedup.mark_ingested("b/k@1")
+    assert not src.dedup.is_ingested("b/k@1")
+
+
+@mock.patch("src.dedup.DEDUP", True)
+@mock.patch("src.dedup._cache", OrderedDict())
+def test_dedup_cache():
+    assert not src.dedup.is_ingested("b/k@1")
+    src.dedup.mark_ingested("b/k@1")
+    assert src.dedup.is_ingested("b/k@1")
+    assert not src.dedup.is_ingested("b/k@2")
+    assert not src.dedup.is_ingested(None)
+
+
+@mock.patch("src.dedup.DEDUP", True)
+@mock.patch("src.dedup.DEDUP_CACHE_SIZE", 2)
+@mock.patch("src.dedup._cache", OrderedDict())
+def test_dedup_cache_lru_eviction():
+    src.dedup.mark_ingested("b/k@1")
+    src.dedup.mark_ingested("b/k@2")
+    # touch 1 so 2 is the least recently used
+    assert src.dedup.is_ingested("b/k@1")
+    src.dedup.mark_ingested("b/k@3")
+    assert list(src.dedup._cache) == ["b/k@1", "b/k@3"]
+
+
+@mock.patch("src.dedup.DEDUP", True)
+@mock.patch("src.dedup.DEDUP_STORE", "file")
+@mock.patch("src.dedup._file_ids", None)
+@mock.patch("src.dedup._cache", OrderedDict())
+def test_dedup_file_store(tmp_path):
+    with mock.patch("src.dedup.DEDUP_FILE", str(tmp_path / "ingested")):
+        assert not src.dedup.is_ingested("b/k@1")
+        src.dedup.mark_ingested("b/k@1")
+
+        # a new container starts with an empty cache and reads the file
+        src.dedup._cache.clear()
+        src.dedup._file_ids = None
+        assert src.dedup.is_ingested("b/k@1")
+        assert "b/k@1" in src.dedup._cache
+        assert (tmp_path / "ingested").read_text() == "b/k@1\n"
+
+
+@mock.patch("src.dedup.DEDUP", True)
+@mock.patch("src.dedup.DEDUP_STORE", "dynamodb")
+@mock.patch("src.dedup._cache", OrderedDict())
+@mock.patch("src.dedup.boto3.client")
+def test_dedup_dynamodb_store(mock_client):
+    mock_client.return_value.get_item.return_value = {}
+    assert not src.dedup.is_ingested("b/k@1")
+    src.dedup.mark_ingested("b/k@1")
+    item = mock_client.return_value.put_item.call_args[1]["Item"]
+    assert item["id"] == {"S": "b/k@1"}
+
+    src.dedup._cache.clear()
+    mock_client.return_value.get_item.return_value = {"Item": item}
+    assert src.dedup.is_ingested("b/k@1")
+
+
+@mock.patch("src.dedup.DEDUP", True)
+@mock.patch("src.dedup.DEDUP_STORE", "dynamodb")
+@mock.patch("src.dedup._cache", OrderedDict())
+@mock.patch("src.dedup.boto3.client")
+def test_dedup_dynamodb_error_not_ingested(mock_client):
+    error = {"Error": {"Code": "ResourceNotFoundException", "Message": "no table"}}
+    mock_client.return_value.get_item.side_effect = (
+        src.dedup.botocore.exceptions.ClientError(error, "GetItem")
+    )
+    mock_client.return_value.put_item.side_effect = (
+        src.dedup.botocore.exceptions.ClientError(error, "PutItem")
+    )
+    assert not src.dedup.is_ingested("b/k@1")
+    src.dedup.mark_ingested("b/k@1")
+    assert "b/k@1" in src.dedup._cache
+
+
+@mock.patch("src.dedup.DEDUP", True)
+@mock.patch("src.dedup.DEDUP_STORE", "dynamodb")
+@mock.patch("src.dedup._cache", OrderedDict())
+@mock.patch("src.dedup.boto3.client")
+def test_dedup_dynamodb_botocore_error_not_ingested(mock_client):
+    exceptions = src.dedup.botocore.exceptions
+    mock_client.return_value.get_item.side_effect = exceptions.EndpointConnectionError(
+        endpoint_url="https://dynamodb"
+    )
+    mock_client.return_value.put_item.side_effect = exceptions.NoCredentialsError()
+    assert not src.dedup.is_ingested("b/k@1")
+    src.dedup.mark_ingested("b/k@1")
+    assert "b/k@1" in src.dedup._cache
+
+
+@mock.patch("src.dedup.DEDUP", True)
+@mock.patch("src.dedup.DEDUP_STORE", "file")
+@mock.patch("src.dedup._file_ids", None)
+@mock.patch("src.dedup._cache", OrderedDict())
+def test_dedup_file_store_error_not_ingested(tmp_path):
+    # a directory cannot be opened as the file, neither call should raise
+    with mock.patch("src.dedup.DEDUP_FILE", str(tmp_path)):
+        assert not src.dedup.is_ingested("b/k@1")
+        src.dedup.mark_ingested("b/k@1")
+        assert "b/k@1" in src.dedup._cache
+
+
+"""
+es_init tests
+
+"""
+
+
+@mock.patch("src.dedup.DEDUP", True)
+@mock.patch("src.dedup._cache", OrderedDict())
+@mock.patch("src.es_stream.bulk_index")
+@mock.patch("src.es_stream.index_exists")
+@mock.patch("src.es_stream.get_docs")
+def test_es_init_skips_ingested(mock_get_docs, mock_index_exists, mock_bulk_index):
+    mock_get_docs.return_value = [json.dumps({"a": 1})]
+    mock_index_exists.return_value = True
+    mock_bulk_index.return_value = True
+    records = [valid_record()]
+    assert src.es_stream.es_init(records)
+    assert src.es_stream.es_init(records)
+    assert mock_get_docs.call_count == 1
+    assert mock_bulk_index.call_count == 1
+
+
+@mock.patch("src.dedup.DEDUP", True)
+@mock.patch("src.dedup._cache", OrderedDict())
+@mock.patch("src.es_stream.bulk_index")
+@mock.patch("src.es_stream.index_exists")
+@mock.patch("src.es_stream.get_docs")
+def test_es_init_failed_not_marked(mock_get_docs, mock_index_exists, mock_bulk_index):
+    mock_get_docs.return_value = [json.dumps({"a": 1})]
+    mock_index_exists.return_value = True
+    mock_bulk_index.return_value = False
+    records = [valid_record()]
+    assert not src.es_stream.es_init(records)
+    assert not src.es_stream.es_init(records)
+    assert mock_bulk_index.call_count == 2
+
+
+@mock.patch("src.dedup.DEDUP", True)
+@mock.patch("src.dedup._cache", OrderedDict())
+@mock.patch("src.es_async.s3_get_object")
+def test_es_init_async_skips_ingested(mock_s3_get_object):
+    mock_s3_get_object.return_value = json.dumps({"a": 1})
+
+    async def es_request(session, method, url, **kwargs):
+        return 200, "TEXT"
+
+    records = [valid_record()]
+    with mock.patch("src.es_async.es_request", es_request):
+        assert src.es_async.es_init(records)
+        assert src.es_async.es_init(records)
+    assert mock_s3_get_object.call_count == 1
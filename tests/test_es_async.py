@@ -0,0 +1,298 @@
+import asyncio
+import json
+import mock
+import threading
+from pathlib import Path
+
+from .context import src
+import src.es_async
+
+RESOURCES = Path("tests/resources/")
+
+"""
+reusable fake es, records every request and answers by method
+
+"""
+
+
+def fake_es(head=200, put=200, post=200):
+    calls = []
+
+    async def es_request(session, method, url, **kwargs):
+        calls.append((method, url))
+        status = {"HEAD": head, "PUT": put, "POST": post}[method]
+        if status is None:
+            return None
+        return status, "TEXT"
+
+    return es_request, calls
+
+
+def records(*keys):
+    valid = json.loads((RESOURCES / "valid_event.json").read_text())["Records"][0]
+    out = []
+    for key in keys:
+        record = json.loads(json.dumps(valid))
+        record["s3"]["object"]["key"] = key
+        out.append(record)
+    return out
+
+
+DOC = json.dumps({"timestamp": "2020-01-01T00:01:01"})
+
+"""
+es_request tests
+
+"""
+
+
+def test_es_request_connection_fail():
+    async def request():
+        async with src.es_async.aiohttp.ClientSession() as session:
+            return await src.es_async.es_request(session, "HEAD", "http://127.0.0.1:1")
+
+    assert asyncio.run(request()) is src.es_async.CONNECTION_FAILED
+
+
+@mock.patch("src.es_async._credentials", "resolved")
+@mock.patch("src.es_async.ES_SIGN_REQUESTS", True)
+@mock.patch("src.es_async.sign_headers")
+def test_es_request_signs_with_resolved_credentials(mock_sign_headers):
+    mock_sign_headers.return_value = {}
+
+    async def request():
+        async with src.es_async.aiohttp.ClientSession() as session:
+            return await src.es_async.es_request(session, "HEAD", "http://127.0.0.1:1")
+
+    asyncio.run(request())
+    assert mock_sign_headers.call_args[1]["credentials"] == "resolved"
+
+
+@mock.patch("src.es_async._credentials", None)
+@mock.patch("src.es_async.ES_SIGN_REQUESTS", True)
+@mock.patch("src.es_async.get_credentials")
+def test_es_init_resolves_credentials_off_loop(mock_get_credentials):
+    threads = []
+
+    def get_credentials():
+        threads.append(threading.current_thread())
+        return "resolved"
+
+    mock_get_credentials.side_effect = get_credentials
+    es_request, calls = fake_es()
+    with mock.patch("src.es_async.es_request", es_request), mock.patch(
+        "src.es_async.s3_get_object", return_value=DOC
+    ):
+        assert src.es_async.es_init(records("serviceA/2020-01-01/log001"))
+    assert len(threads) == 1
+    assert threads[0] is not threading.main_thread()
+    assert src.es_async._credentials == "resolved"
+
+
+@mock.patch.dict(
+    "src.transport._nodes",
+    {
+        "http://a:9200": {"in_flight": 0, "failures": 0, "dead_until": 0.0},
+        "http://b:9200": {"in_flight": 0, "failures": 0, "dead_until": 0.0},
+    },
+    clear=True,
+)
+def test_es_send_timeout_not_resent():
+    # a bulk that timed out may have been applied, it is not sent elsewhere
+    session = mock.Mock()
+    session.request.side_effect = asyncio.TimeoutError()
+    r = asyncio.run(src.es_async.es_send(session, "POST", "/i/_doc/_bulk", "doc"))
+    assert r is None
+    assert session.request.call_count == 1
+    assert src.transport._nodes["http://a:9200"]["failures"] == 0
+    assert src.transport._nodes["http://b:9200"]["failures"] == 0
+
+
+@mock.patch.dict(
+    "src.transport._nodes",
+    {"http://a:9200": {"in_flight": 0, "failures": 0, "dead_until": 0.0}},
+    clear=True,
+)
+def test_es_send_concurrent_failure_keeps_success():
+    # one sender fails to connect while another succeeds on the same endpoint,
+    # the success must not be thrown away or sent again
+    calls = []
+
+    async def es_request(session, method, url, data=None):
+        calls.append(data)
+        if data == "fails":
+            return src.es_async.CONNECTION_FAILED
+        await asyncio.sleep(0.01)
+        return 200, "TEXT"
+
+    async def run():
+        return await asyncio.gather(
+            src.es_async.es_send(None, "POST", "/i/_doc/_bulk", data="succeeds"),
+            src.es_async.es_send(None, "POST", "/i/_doc/_bulk", data="fails"),
+        )
+
+    with mock.patch("src.es_async.es_request", es_request):
+        assert asyncio.run(run()) == [(200, "TEXT"), None]
+    assert calls == ["succeeds", "fails"]
+
+
+"""
+es_init tests
+
+"""
+
+
+@mock.patch("src.es_async.s3_get_object")
+def test_es_init_success(mock_s3_get_object):
+    mock_s3_get_object.return_value = DOC
+    es_request, calls = fake_es()
+    with mock.patch("src.es_async.es_request", es_request):
+        assert src.es_async.es_init(
+            records(
+                "serviceA/2020-01-01/log001",
+                "serviceA/2020-01-01/log002",
+                "serviceA/2020-01-02/log001",
+            )
+        )
+    posts = [url for method, url in calls if method == "POST"]
+    heads = [url for method, url in calls if method == "HEAD"]
+    assert len(posts) == 3
+    # one index check per index, shared by the senders
+    assert len(heads) == 2
+
+
+@mock.patch("src.es_async.s3_get_object")
+def test_es_init_create_index_success(mock_s3_get_object):
+    mock_s3_get_object.return_value = DOC
+    es_request, calls = fake_es(head=404)
+    with mock.patch("src.es_async.es_request", es_request):
+        assert src.es_async.es_init(records("serviceA/2020-01-01/log001"))
+    assert [method for method, url in calls] == ["HEAD", "PUT", "POST"]
+
+
+@mock.patch("src.es_async.s3_get_object")
+def test_es_init_create_index_fail(mock_s3_get_object):
+    mock_s3_get_object.return_value = DOC
+    es_request, calls = fake_es(head=404, put=400)
+    with mock.patch("src.es_async.es_request", es_request):
+        assert not src.es_async.es_init(records("serviceA/2020-01-01/log001"))
+    assert "POST" not in [method for method, url in calls]
+
+
+@mock.patch("src.es_async.s3_get_object")
+def test_es_init_bulk_index_fail(mock_s3_get_object):
+    mock_s3_get_object.return_value = DOC
+    es_request, calls = fake_es(post=500)
+    with mock.patch("src.es_async.es_request", es_request):
+        assert not src.es_async.es_init(records("serviceA/2020-01-01/log001"))
+
+
+@mock.patch("src.es_async.s3_get_object")
+def test_es_init_connection_fail(mock_s3_get_object):
+    mock_s3_get_object.return_value = DOC
+    es_request, calls = fake_es(head=None, put=None)
+    with mock.patch("src.es_async.es_request", es_request):
+        assert not src.es_async.es_init(records("serviceA/2020-01-01/log001"))
+
+
+@mock.patch("src.es_async.s3_get_object")
+def test_es_init_s3_none_fail(mock_s3_get_object):
+    mock_s3_get_object.return_value = None
+    es_request, calls = fake_es()
+    with mock.patch("src.es_async.es_request", es_request):
+        assert not src.es_async.es_init(records("serviceA/2020-01-01/log001"))
+    assert calls == []
+
+
+@mock.patch("src.es_async.s3_get_object")
+def test_es_init_not_index_fail(mock_s3_get_object):
+    mock_s3_get_object.return_value = DOC
+    es_request, calls = fake_es()
+    with mock.patch("src.es_async.es_request", es_request):
+        assert not src.es_async.es_init(records("something/random"))
+    assert calls == []
+
+
+@mock.patch("src.es_async.s3_get_object")
+def test_es_init_not_bulk_doc_fail(mock_s3_get_object):
+    mock_s3_get_object.return_value = "invalid_json"
+    es_request, calls = fake_es()
+    with mock.patch("src.es_async.es_request", es_request):
+        assert not src.es_async.es_init(records("serviceA/2020-01-01/log001"))
+    assert calls == []
+
+
+@mock.patch("src.es_async.MEMORY_CEILING", 150)
+@mock.patch("src.es_async.s3_get_object")
+def test_es_init_memory_ceiling_throttles_reads(mock_s3_get_object):
+    # a file fits under the ceiling while parsed, two do not, so a file is
+    # only read once the one before it has been sent
+    es_request, calls = fake_es()
+
+    def s3_get_object(bucket, key):
+        calls.append(("GET", key))
+        return DOC
+
+    mock_s3_get_object.side_effect = s3_get_object
+    sized = records("serviceA/2020-01-01/log001", "serviceA/2020-01-01/log002")
+    for record in sized:
+        record["s3"]["object"]["size"] = len(DOC)
+    with mock.patch("src.es_async.es_request", es_request):
+        assert src.es_async.es_init(sized)
+    methods = [method for method, url in calls if method != "HEAD"]
+    assert methods == ["GET", "POST", "GET", "POST"]
+
+
+@mock.patch("src.es_async.MEMORY_CEILING", 150)
+@mock.patch("src.es_async.stream_index")
+@mock.patch("src.es_async.s3_get_object")
+def test_es_init_memory_ceiling_streams_large_files(
+    mock_s3_get_object, mock_stream_index
+):
+    # the event size is bigger than the ceiling allows to parse whole
+    mock_stream_index.return_value = True
+    es_request, calls = fake_es()
+    with mock.patch("src.es_async.es_request", es_request):
+        assert src.es_async.es_init(records("serviceA/2020-01-01/log001"))
+    mock_stream_index.assert_called_once_with("S3bucket", "serviceA/2020-01-01/log001")
+    assert not mock_s3_get_object.called
+
+    mock_stream_index.return_value = False
+    with mock.patch("src.es_async.es_request", es_request):
+        assert not src.es_async.es_init(records("serviceA/2020-01-01/log001"))
+
+
+@mock.patch.dict(
+    "src.es_stream.TRANSFORMS", {"serviceA": {"sample": {"rates": {"debug": 0.0}}}}
+)
+@mock.patch("src.es_async.s3_get_object")
+def test_es_init_all_filtered_success(mock_s3_get_object):
+    mock_s3_get_object.return_value = json.dumps({"level": "debug"})
+    es_request, calls = fake_es()
+    with mock.patch("src.es_async.es_request", es_request):
+        assert src.es_async.es_init(records("serviceA/2020-01-01/log001"))
+    assert calls == []
+
+
+def test_es_init_invalid_event_fail():
+    invalid_records = json.loads((RESOURCES / "invalid_event.json").read_text())
+    assert not src.es_async.es_init(invalid_records["Records"])
+
+
+@mock.patch("src.es_async.aiohttp", None)
+def test_es_init_no_aiohttp_fail():
+    assert not src.es_async.es_init(records("serviceA/2020-01-01/log001"))
+
+
+"""
+main tests
+
+"""
+
+
+@mock.patch("src.es_async.es_init")
+@mock.patch("src.es_stream.ENGINE", "async")
+def test_main_async_engine(mock_es_init):
+    mock_es_init.return_value = True
+    assert src.es_stream.main({"Records": [{"one": 1}]}, "context")
+    mock_es_init.assert_called_once_with([{"one": 1}])
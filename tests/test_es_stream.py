@@ -3,6 +3,7 @@ import mock
 from pathlib import Path
 
 from .context import src
+import src.memory
 
 RESOURCES = Path("tests/resources/")
 
@@ -173,6 +174,130 @@ def test_prepare_bulk_doc_success():
     assert src.es_stream.prepare_bulk_doc(docs) == bulk_doc
 
 
+"""
+bulk_batches tests
+
+"""
+
+
+def test_bulk_batches_under_ceiling():
+    docs = [json.dumps({"message": "x" * 80}) for _ in range(20)]
+    governor = src.memory.Governor(1000)
+    stats = {"parsed": 0}
+    batches = list(src.es_stream.bulk_batches(iter(docs), "serviceA", governor, stats))
+    assert len(batches) > 1
+    assert stats["parsed"] == 20
+    assert "".join(batches) == src.es_stream.prepare_bulk_doc(docs)
+    # under the ceiling, plus the doc that did not fit in the batch
+    assert governor.peak <= 1000 + len(src.es_stream.bulk_line(docs[0]))
+    assert governor.total() == 0
+
+
+def test_bulk_batches_counts_encoded_copy():
+    docs = [json.dumps({"message": "x" * 80}) for _ in range(20)]
+    governor = src.memory.Governor(1000)
+    stats = {"parsed": 0}
+    for bulk_doc in src.es_stream.bulk_batches(iter(docs), None, governor, stats):
+        # the batch and the bytes bulk_index sends are both counted
+        assert governor.buffered["send"] == 2 * len(bulk_doc)
+    assert governor.total() == 0
+
+
+def test_bulk_batches_invalid_json_skipped():
+    governor = src.memory.Governor(1000)
+    stats = {"parsed": 0}
+    batches = src.es_stream.bulk_batches(iter(["invalid_json"]), None, governor, stats)
+    assert list(batches) == []
+    assert stats["parsed"] == 0
+
+
+@mock.patch.dict(
+    "src.es_stream.TRANSFORMS", {"serviceA": {"sample": {"rates": {"debug": 0.0}}}}
+)
+def test_bulk_batches_filtered_out_counted():
+    governor = src.memory.Governor(1000)
+    stats = {"parsed": 0}
+    docs = iter([json.dumps({"level": "debug"})] * 3)
+    assert list(src.es_stream.bulk_batches(docs, "serviceA", governor, stats)) == []
+    assert stats["parsed"] == 3
+
+
+"""
+stream_index tests
+
+"""
+
+
+def test_stream_index_not_index_fail():
+    assert not src.es_stream.stream_index("bucket", "something/random")
+
+
+@mock.patch("src.es_stream.s3_stream_lines")
+def test_stream_index_s3_none_fail(mock_s3_stream_lines):
+    mock_s3_stream_lines.return_value = None
+    assert not src.es_stream.stream_index("bucket", "serviceA/2020-01-01/log001")
+
+
+@mock.patch("src.es_stream.bulk_index")
+@mock.patch("src.es_stream.s3_stream_lines")
+def test_stream_index_no_valid_docs_fail(mock_s3_stream_lines, mock_bulk_index):
+    mock_s3_stream_lines.return_value = iter(["invalid_json"])
+    assert not src.es_stream.stream_index("bucket", "serviceA/2020-01-01/log001")
+    assert not mock_bulk_index.called
+
+
+@mock.patch("src.es_stream.create_index")
+@mock.patch("src.es_stream.index_exists")
+@mock.patch("src.es_stream.s3_stream_lines")
+def test_stream_index_create_index_fail(
+    mock_s3_stream_lines, mock_index_exists, mock_create_index
+):
+    mock_s3_stream_lines.return_value = iter([json.dumps({"a": 1})])
+    mock_index_exists.return_value = False
+    mock_create_index.return_value = False
+    assert not src.es_stream.stream_index("bucket", "serviceA/2020-01-01/log001")
+
+
+@mock.patch("src.es_stream.bulk_index")
+@mock.patch("src.es_stream.index_exists")
+@mock.patch("src.es_stream.s3_stream_lines")
+def test_stream_index_bulk_index_fail(
+    mock_s3_stream_lines, mock_index_exists, mock_bulk_index
+):
+    mock_s3_stream_lines.return_value = iter([json.dumps({"a": 1})])
+    mock_index_exists.return_value = True
+    mock_bulk_index.return_value = False
+    assert not src.es_stream.stream_index("bucket", "serviceA/2020-01-01/log001")
+
+
+@mock.patch("src.es_stream.MEMORY_CEILING", 200)
+@mock.patch("src.es_stream.bulk_index")
+@mock.patch("src.es_stream.index_exists")
+@mock.patch("src.es_stream.s3_stream_lines")
+def test_stream_index_success(mock_s3_stream_lines, mock_index_exists, mock_bulk_index):
+    docs = [json.dumps({"message": "x" * 40}) for _ in range(10)]
+    mock_s3_stream_lines.return_value = iter(docs)
+    mock_index_exists.return_value = True
+    mock_bulk_index.return_value = True
+    assert src.es_stream.stream_index("bucket", "serviceA/2020-01-01/log001")
+    # the index is checked once, the docs are sent in several batches
+    assert mock_index_exists.call_count == 1
+    assert mock_bulk_index.call_count > 1
+    for call in mock_bulk_index.call_args_list:
+        assert call[0][0] == "serviceA-2020.01.01"
+
+
+@mock.patch.dict(
+    "src.es_stream.TRANSFORMS", {"serviceA": {"sample": {"rates": {"debug": 0.0}}}}
+)
+@mock.patch("src.es_stream.bulk_index")
+@mock.patch("src.es_stream.s3_stream_lines")
+def test_stream_index_all_filtered_success(mock_s3_stream_lines, mock_bulk_index):
+    mock_s3_stream_lines.return_value = iter([json.dumps({"level": "debug"})])
+    assert src.es_stream.stream_index("bucket", "serviceA/2020-01-01/log001")
+    assert not mock_bulk_index.called
+
+
 """
 es_init tests
 
@@ -314,6 +439,41 @@ def test_es_init_create_index_true_success(
     assert src.es_stream.es_init(valid_records["Records"])
 
 
+@mock.patch("src.es_stream.MEMORY_CEILING", 1024)
+@mock.patch("src.es_stream.get_docs")
+@mock.patch("src.es_stream.stream_index")
+def test_es_init_memory_ceiling_streams(mock_stream_index, mock_get_docs):
+    mock_stream_index.return_value = True
+    valid_records = json.loads((RESOURCES / "valid_event.json").read_text())
+    assert src.es_stream.es_init(valid_records["Records"])
+    mock_stream_index.assert_called_once_with("S3bucket", "serviceA/2020-01-01/log001")
+    assert not mock_get_docs.called
+
+
+@mock.patch("src.es_stream.MEMORY_CEILING", 1024)
+@mock.patch("src.es_stream.stream_index")
+def test_es_init_memory_ceiling_stream_fail(mock_stream_index):
+    mock_stream_index.return_value = False
+    valid_records = json.loads((RESOURCES / "valid_event.json").read_text())
+    assert not src.es_stream.es_init(valid_records["Records"])
+
+
+@mock.patch.dict(
+    "src.es_stream.TRANSFORMS", {"serviceA": {"sample": {"rates": {"debug": 0.0}}}}
+)
+@mock.patch("src.es_stream.mark_ingested")
+@mock.patch("src.es_stream.bulk_index")
+@mock.patch("src.es_stream.get_docs")
+def test_es_init_all_filtered_success(
+    mock_get_docs, mock_bulk_index, mock_mark_ingested
+):
+    mock_get_docs.return_value = [json.dumps({"level": "debug"})] * 3
+    valid_records = json.loads((RESOURCES / "valid_event.json").read_text())
+    assert src.es_stream.es_init(valid_records["Records"])
+    assert not mock_bulk_index.called
+    assert mock_mark_ingested.called
+
+
 """
 main tests
 
@@ -91,6 +91,56 @@ def test_s3_client_get_object_success():
     assert s3_data == body
 
 
+"""
+s3_stream_lines tests
+
+"""
+
+
+@moto.mock_s3
+def test_s3_stream_lines_none_no_key():
+    conn = boto3.client("s3", region_name=REGION)
+    conn.create_bucket(Bucket="bucket")
+    assert src.helper.s3_stream_lines("bucket", "path/key") is None
+
+
+@moto.mock_s3
+def test_s3_stream_lines_success():
+    bucket = "bucket"
+    key = "path/key"
+    conn = boto3.client("s3", region_name=REGION)
+    conn.create_bucket(Bucket=bucket)
+    conn.put_object(Bucket=bucket, Key=key, Body="line1\nline2\nline3")
+
+    lines = src.helper.s3_stream_lines(bucket, key, chunk_size=4)
+    assert list(lines) == ["line1", "line2", "line3"]
+
+
+"""
+s3_upload_file tests
+
+"""
+
+
+@moto.mock_s3
+def test_s3_upload_file_no_bucket(tmp_path):
+    path = tmp_path / "record.gz"
+    path.write_bytes(b"data")
+    assert not src.helper.s3_upload_file(str(path), "bucket", "path/key")
+
+
+@moto.mock_s3
+def test_s3_upload_file_success(tmp_path):
+    path = tmp_path / "record.gz"
+    path.write_bytes(b"data")
+    conn = boto3.client("s3", region_name=REGION)
+    conn.create_bucket(Bucket="bucket")
+
+    assert src.helper.s3_upload_file(str(path), "bucket", "path/key")
+    body = conn.get_object(Bucket="bucket", Key="path/key")["Body"].read()
+    assert body == b"data"
+
+
 """
 post_request tests
 
@@ -103,17 +153,29 @@ def test_post_request_fail_connection(mock_request):
     mock_request.return_value = mock_response(
         status=0, raise_for_status=requests.exceptions.ConnectionError("connection")
     )
-    assert src.helper.post_request(url="someurl", body="", headers="") is None
+    assert src.helper.post_request(url="someurl", body="", headers="") is (
+        src.helper.CONNECTION_FAILED
+    )
 
 
 @mock.patch("src.helper.requests.post")
-def test_post_request_fail_timeout(mock_request):
+def test_post_request_fail_read_timeout(mock_request):
     mock_request.return_value = mock_response(
-        status=0, raise_for_status=requests.exceptions.Timeout("timeout")
+        status=0, raise_for_status=requests.exceptions.ReadTimeout("timeout")
     )
     assert src.helper.post_request(url="someurl", body="", headers="") is None
 
 
+@mock.patch("src.helper.requests.post")
+def test_post_request_fail_connect_timeout(mock_request):
+    mock_request.return_value = mock_response(
+        status=0, raise_for_status=requests.exceptions.ConnectTimeout("timeout")
+    )
+    assert src.helper.post_request(url="someurl", body="", headers="") is (
+        src.helper.CONNECTION_FAILED
+    )
+
+
 @mock.patch("src.helper.requests.post")
 def test_post_request_fail_random(mock_request):
     mock_request.return_value = mock_response(
@@ -138,6 +200,18 @@ def test_post_request_fail_500(mock_request):
     assert src.helper.post_request(url="someurl", body="", headers="") is None
 
 
+@mock.patch("src.helper.requests.post")
+def test_post_request_fail_429_return_errors(mock_request):
+    response = mock_response(status=429)
+    response.raise_for_status.side_effect = requests.exceptions.HTTPError(
+        "429", response=response
+    )
+    mock_request.return_value = response
+    r = src.helper.post_request(url="someurl", return_errors=True, headers="")
+    assert r.status_code == 429
+    assert "return_errors" not in mock_request.call_args[1]
+
+
 @mock.patch("src.helper.requests.post")
 def test_post_request_success_201(mock_request):
     mock_request.return_value = mock_response(status=201, content="updated")
@@ -158,17 +232,29 @@ def test_head_request_fail_connection(mock_request):
     mock_request.return_value = mock_response(
         status=0, raise_for_status=requests.exceptions.ConnectionError("connection")
     )
-    assert src.helper.head_request(url="someurl", headers="") is None
+    assert src.helper.head_request(url="someurl", headers="") is (
+        src.helper.CONNECTION_FAILED
+    )
 
 
 @mock.patch("src.helper.requests.head")
-def test_head_request_fail_timeout(mock_request):
+def test_head_request_fail_read_timeout(mock_request):
     mock_request.return_value = mock_response(
-        status=0, raise_for_status=requests.exceptions.Timeout("timeout")
+        status=0, raise_for_status=requests.exceptions.ReadTimeout("timeout")
     )
     assert src.helper.head_request(url="someurl", headers="") is None
 
 
+@mock.patch("src.helper.requests.head")
+def test_head_request_fail_connect_timeout(mock_request):
+    mock_request.return_value = mock_response(
+        status=0, raise_for_status=requests.exceptions.ConnectTimeout("timeout")
+    )
+    assert src.helper.head_request(url="someurl", headers="") is (
+        src.helper.CONNECTION_FAILED
+    )
+
+
 @mock.patch("src.helper.requests.head")
 def test_head_request_fail_random(mock_request):
     mock_request.return_value = mock_response(
@@ -213,17 +299,29 @@ def test_put_request_fail_connection(mock_request):
     mock_request.return_value = mock_response(
         status=0, raise_for_status=requests.exceptions.ConnectionError("connection")
     )
-    assert src.helper.put_request(url="someurl", headers="") is None
+    assert src.helper.put_request(url="someurl", headers="") is (
+        src.helper.CONNECTION_FAILED
+    )
 
 
 @mock.patch("src.helper.requests.put")
-def test_put_request_fail_timeout(mock_request):
+def test_put_request_fail_read_timeout(mock_request):
     mock_request.return_value = mock_response(
-        status=0, raise_for_status=requests.exceptions.Timeout("timeout")
+        status=0, raise_for_status=requests.exceptions.ReadTimeout("timeout")
     )
     assert src.helper.put_request(url="someurl", headers="") is None
 
 
+@mock.patch("src.helper.requests.put")
+def test_put_request_fail_connect_timeout(mock_request):
+    mock_request.return_value = mock_response(
+        status=0, raise_for_status=requests.exceptions.ConnectTimeout("timeout")
+    )
+    assert src.helper.put_request(url="someurl", headers="") is (
+        src.helper.CONNECTION_FAILED
+    )
+
+
 @mock.patch("src.helper.requests.put")
 def test_put_request_fail_random(mock_request):
     mock_request.return_value = mock_response(
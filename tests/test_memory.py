@@ -0,0 +1,133 @@
+import asyncio
+import json
+import subprocess
+import sys
+
+from .context import src
+import src.memory
+
+"""
+Governor tests
+
+"""
+
+
+def test_governor_fits():
+    governor = src.memory.Governor(100)
+    # an empty pipeline takes anything
+    assert governor.fits(1000)
+    governor.reserve("parse", 60)
+    assert governor.fits(40)
+    assert not governor.fits(41)
+
+
+def test_governor_reserve_release_peak():
+    governor = src.memory.Governor(100)
+    governor.reserve("read", 30)
+    governor.reserve("parse", 50)
+    governor.release("read", 30)
+    governor.reserve("send", 10)
+    assert governor.total() == 60
+    assert governor.peak == 80
+    governor.release("send", 20)
+    assert governor.buffered == {"read": 0, "parse": 50, "send": 0}
+
+
+def test_async_governor_acquire_waits():
+    events = []
+
+    async def run():
+        governor = src.memory.AsyncGovernor(100)
+        await governor.acquire("read", 80)
+
+        async def reader():
+            await governor.acquire("read", 80)
+            events.append("second read")
+
+        task = asyncio.ensure_future(reader())
+        await asyncio.sleep(0)
+        events.append("first sent")
+        await governor.free("read", 80)
+        await task
+        return governor.peak
+
+    assert asyncio.run(run()) == 80
+    assert events == ["first sent", "second read"]
+
+
+"""
+peak rss tests
+
+"""
+
+# the es stand-in runs in its own process, so the bodies it reads do not
+# count towards the rss measured
+SERVER_SCRIPT = """
+import time
+
+from bench.replay import serve_fake
+
+server = serve_fake()
+print(server.server_address[1], flush=True)
+time.sleep(600)
+"""
+
+RSS_SCRIPT = """
+import json
+import resource
+import sys
+
+import mock
+
+import src.es_stream as es
+import src.transport as transport
+
+SIZE, CEILING, ENDPOINT = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3]
+
+
+def lines():
+    pad = "x" * 1000
+    for i in range(SIZE // 1024):
+        yield json.dumps({"i": i, "level": "info", "message": pad})
+
+
+def maxrss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+transport._nodes.clear()
+transport.add_endpoint(ENDPOINT)
+with mock.patch.object(es, "MEMORY_CEILING", CEILING), mock.patch.object(
+    es, "s3_stream_lines", return_value=lines()
+):
+    before = maxrss()
+    ok = es.stream_index("bucket", "serviceA/2020-01-01/log001")
+    after = maxrss()
+print(json.dumps({"ok": ok, "growth": after - before}))
+"""
+
+
+def test_stream_index_peak_rss_under_budget():
+    # 256MB of docs streamed through a 16MB ceiling and sent over http with
+    # the real bulk_index, in a fresh process so the peak rss is not that of
+    # the tests run before
+    size = 256 * 1024 * 1024
+    ceiling = 16 * 1024 * 1024
+    server = subprocess.Popen(
+        [sys.executable, "-c", SERVER_SCRIPT], stdout=subprocess.PIPE, text=True
+    )
+    try:
+        endpoint = "http://127.0.0.1:" + server.stdout.readline().strip()
+        out = subprocess.run(
+            [sys.executable, "-c", RSS_SCRIPT, str(size), str(ceiling), endpoint],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    finally:
+        server.kill()
+        server.wait()
+        server.stdout.close()
+    result = json.loads(out.stdout.splitlines()[-1])
+    assert result["ok"]
+    assert result["growth"] < 2 * ceiling
@@ -0,0 +1,224 @@
+import asyncio
+import gzip
+import json
+import mock
+import threading
+
+from .context import src
+import src.recorder
+import src.es_async
+from bench import replay
+
+"""
+record_bulk tests
+
+"""
+
+
+@mock.patch("src.recorder.RECORD_FILE", None)
+@mock.patch("src.recorder.gzip.open")
+def test_record_bulk_disabled(mock_open):
+    src.recorder.record_bulk("index", "doc", 0.0, 0.1, 200)
+    assert not mock_open.called
+
+
+@mock.patch("src.recorder.RECORD_PAYLOAD_RATE", 0.0)
+def test_record_bulk_entries(tmp_path):
+    path = str(tmp_path / "record.gz")
+    bulk_doc = src.es_stream.prepare_bulk_doc(['{"a": 1}', '{"a": 2}'])
+    with mock.patch("src.recorder.RECORD_FILE", path):
+        src.recorder.record_bulk("serviceA-2020.01.01", bulk_doc, 100.0, 0.25, 200)
+        src.recorder.record_bulk("serviceA-2020.01.01", bulk_doc, 101.5, 0.5, None)
+
+    entries = list(src.recorder.load(path))
+    assert entries == [
+        {
+            "t": 100.0,
+            "index": "serviceA-2020.01.01",
+            "docs": 2,
+            "bytes": len(bulk_doc),
+            "duration": 0.25,
+            "status": 200,
+        },
+        {
+            "t": 101.5,
+            "index": "serviceA-2020.01.01",
+            "docs": 2,
+            "bytes": len(bulk_doc),
+            "duration": 0.5,
+            "status": None,
+        },
+    ]
+
+
+@mock.patch("src.recorder.RECORD_PAYLOAD_RATE", 1.0)
+def test_record_bulk_payload_sampled(tmp_path):
+    path = str(tmp_path / "record.gz")
+    with mock.patch("src.recorder.RECORD_FILE", path):
+        src.recorder.record_bulk("index", '{"index":{}}\n{}\n', 0.0, 0.1, 200)
+    with gzip.open(path, "rt") as f:
+        assert json.loads(f.readline())["payload"] == '{"index":{}}\n{}\n'
+
+
+@mock.patch("src.es_stream.record_bulk")
+@mock.patch("src.es_stream.send")
+def test_bulk_index_records(mock_send, mock_record_bulk):
+    mock_send.return_value = mock.Mock(status_code=200, text="updated")
+    assert src.es_stream.bulk_index("index", "doc1")
+    args = mock_record_bulk.call_args[0]
+    assert args[:2] == ("index", "doc1")
+    assert args[4] == 200
+
+    assert mock_send.call_args[1]["return_errors"]
+
+    mock_send.return_value = mock.Mock(status_code=429, text="too many requests")
+    assert not src.es_stream.bulk_index("index", "doc1")
+    assert mock_record_bulk.call_args[0][4] == 429
+
+    mock_send.return_value = None
+    assert not src.es_stream.bulk_index("index", "doc1")
+    assert mock_record_bulk.call_args[0][4] is None
+
+
+@mock.patch("src.recorder.RECORD_PAYLOAD_RATE", 0.0)
+def test_record_bulk_truncated_file(tmp_path):
+    path = str(tmp_path / "record.gz")
+    with mock.patch("src.recorder.RECORD_FILE", path):
+        src.recorder.record_bulk("index", "doc1", 100.0, 0.1, 200)
+        src.recorder.record_bulk("index", "doc1", 101.0, 0.1, 200)
+    # a container dropped halfway through writing the second entry
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:-10])
+    assert [e["t"] for e in src.recorder.load(path)] == [100.0]
+
+
+@mock.patch("src.recorder.RECORD_PAYLOAD_RATE", 0.0)
+@mock.patch("src.es_stream.send")
+def test_record_bulk_error_does_not_fail_bulk(mock_send, tmp_path):
+    mock_send.return_value = mock.Mock(status_code=200, text="updated")
+    # a directory cannot be opened as the record file
+    with mock.patch("src.recorder.RECORD_FILE", str(tmp_path)):
+        assert src.es_stream.bulk_index("index", "doc1")
+
+
+@mock.patch("src.recorder.RECORD_PAYLOAD_RATE", 0.0)
+def test_record_bulk_bytes_non_ascii(tmp_path):
+    path = str(tmp_path / "record.gz")
+    bulk_doc = src.es_stream.prepare_bulk_doc(['{"msg": "caf\u00e9 \u2603"}'])
+    with mock.patch("src.recorder.RECORD_FILE", path):
+        src.recorder.record_bulk("index", bulk_doc, 100.0, 0.1, 200)
+    entry = next(src.recorder.load(path))
+    assert entry["bytes"] == len(bulk_doc.encode("utf-8"))
+
+
+@mock.patch("src.es_async.record_bulk")
+def test_async_bulk_index_records_off_loop(mock_record_bulk):
+    threads = []
+    mock_record_bulk.side_effect = lambda *args: threads.append(
+        threading.current_thread()
+    )
+
+    async def es_send(session, method, path, data=None):
+        return 200, "updated"
+
+    with mock.patch("src.es_async.es_send", es_send):
+        assert asyncio.run(src.es_async.bulk_index(None, "index", "doc1"))
+    assert mock_record_bulk.call_args[0][4] == 200
+    assert threads and threads[0] is not threading.main_thread()
+
+
+"""
+upload tests
+
+"""
+
+
+@mock.patch("src.recorder.RECORD_BUCKET", None)
+@mock.patch("src.recorder.s3_upload_file")
+def test_upload_disabled(mock_upload, tmp_path):
+    path = tmp_path / "record.gz"
+    path.write_bytes(b"data")
+    with mock.patch("src.recorder.RECORD_FILE", str(path)):
+        assert not src.recorder.upload("request-id")
+    assert not mock_upload.called
+
+
+@mock.patch("src.recorder.RECORD_BUCKET", "bucket")
+@mock.patch("src.recorder.RECORD_PREFIX", "records/")
+@mock.patch("src.recorder.s3_upload_file")
+def test_upload_removes_file(mock_upload, tmp_path):
+    path = tmp_path / "record.gz"
+    mock_upload.return_value = True
+    with mock.patch("src.recorder.RECORD_FILE", str(path)):
+        # nothing recorded in this invocation
+        assert not src.recorder.upload("request-id")
+        src.recorder.record_bulk("index", "doc1", 100.0, 0.1, 200)
+        assert src.recorder.upload("request-id")
+    args = mock_upload.call_args[0]
+    assert args[:2] == (str(path), "bucket")
+    assert args[2].startswith("records/") and args[2].endswith("/request-id.gz")
+    assert not path.exists()
+
+
+@mock.patch("src.recorder.RECORD_BUCKET", "bucket")
+@mock.patch("src.recorder.s3_upload_file")
+def test_upload_fail_keeps_file(mock_upload, tmp_path):
+    path = tmp_path / "record.gz"
+    mock_upload.return_value = False
+    with mock.patch("src.recorder.RECORD_FILE", str(path)):
+        src.recorder.record_bulk("index", "doc1", 100.0, 0.1, 200)
+        assert not src.recorder.upload()
+    assert len(list(src.recorder.load(str(path)))) == 1
+
+
+@mock.patch("src.es_stream.upload")
+@mock.patch("src.es_stream.es_init")
+def test_main_uploads_recording(mock_es_init, mock_upload):
+    mock_es_init.return_value = False
+    context = mock.Mock(aws_request_id="request-id")
+    assert not src.es_stream.main({"Records": []}, context)
+    mock_upload.assert_called_once_with("request-id")
+
+
+"""
+replay tests
+
+"""
+
+
+def test_replay_payload_filler_size():
+    entry = {"index": "i", "docs": 10, "bytes": 5000}
+    bulk_doc = replay.payload(entry)
+    assert bulk_doc.count("\n") == 20
+    assert abs(len(bulk_doc) - 5000) < 10
+    assert replay.payload(dict(entry, payload="recorded")) == "recorded"
+
+
+def test_replay_against_fake():
+    server = replay.serve_fake()
+    target = "http://127.0.0.1:{}".format(server.server_address[1])
+    entries = [
+        {"t": 100.0 + i * 0.1, "index": "i", "docs": 5, "bytes": 1000}
+        for i in range(10)
+    ]
+    try:
+        summary = replay.replay(entries, target, speed=10, concurrency=4)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert summary["requests"] == 10
+    assert summary["errors"] == 0
+    assert summary["recorded_span"] == 0.9
+    # 10x speed, the 0.9s recorded span replays in about 0.09s
+    assert 0.09 <= summary["elapsed"] < 0.9
+    assert server.stats["requests"] == 10
+    assert abs(server.stats["bytes"] - 10000) < 100
+
+
+def test_replay_errors_counted():
+    entries = [{"t": 0.0, "index": "i", "docs": 1, "bytes": 10}]
+    summary = replay.replay(entries, "http://127.0.0.1:1", speed=0)
+    assert summary["errors"] == 1
+    assert replay.replay([], "http://127.0.0.1:1") == {"requests": 0}
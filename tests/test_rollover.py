@@ -0,0 +1,161 @@
+import json
+import mock
+
+from .context import src
+import src.rollover
+
+"""
+reusable mock_response method
+
+"""
+
+
+def mock_response(status=200, json_data=None):
+    mock_resp = mock.Mock()
+    mock_resp.status_code = status
+    mock_resp.json = mock.Mock(return_value=json_data)
+    return mock_resp
+
+
+def test_write_alias():
+    assert src.rollover.write_alias("serviceA") == "serviceA-write"
+
+
+"""
+alias_ready tests
+
+"""
+
+
+@mock.patch("src.rollover._aliases", set())
+@mock.patch("src.rollover.send")
+def test_alias_ready_exists_cached(mock_send):
+    mock_send.return_value = mock_response(status=200)
+    assert src.rollover.alias_ready("serviceA-write")
+    assert src.rollover.alias_ready("serviceA-write")
+    assert mock_send.call_count == 1
+    assert mock_send.call_args[0][1] == "/_alias/serviceA-write"
+
+
+@mock.patch("src.rollover._aliases", set())
+@mock.patch("src.rollover.send")
+def test_alias_ready_creates_first_index(mock_send):
+    mock_send.side_effect = [None, mock_response(status=200)]
+    assert src.rollover.alias_ready("serviceA-write")
+    args, kwargs = mock_send.call_args
+    assert args[1] == "/serviceA-000001"
+    assert json.loads(kwargs["data"]) == {
+        "aliases": {"serviceA-write": {"is_write_index": True}}
+    }
+    assert "serviceA-write" in src.rollover._aliases
+
+
+@mock.patch("src.rollover._aliases", set())
+@mock.patch("src.rollover.send")
+def test_alias_ready_create_fail(mock_send):
+    mock_send.side_effect = [None, None, mock_response(status=404)]
+    assert not src.rollover.alias_ready("serviceA-write")
+    assert mock_send.call_count == 3
+    assert "serviceA-write" not in src.rollover._aliases
+
+
+@mock.patch("src.rollover._aliases", set())
+@mock.patch("src.rollover.send")
+def test_alias_ready_created_by_another_container(mock_send):
+    # the put fails with resource_already_exists, the alias is there now
+    mock_send.side_effect = [mock_response(status=404), None, mock_response(status=200)]
+    assert src.rollover.alias_ready("serviceA-write")
+    assert mock_send.call_args_list[2][0][1] == "/_alias/serviceA-write"
+    assert "serviceA-write" in src.rollover._aliases
+
+
+@mock.patch("src.rollover._aliases", set())
+@mock.patch("src.rollover.send")
+def test_alias_ready_connection_fail(mock_send):
+    mock_send.return_value = None
+    assert not src.rollover.alias_ready("serviceA-write")
+
+
+"""
+maybe_rollover tests
+
+"""
+
+
+@mock.patch("src.rollover.ROLLOVER_CHECK_INTERVAL", 300)
+@mock.patch("src.rollover.ROLLOVER_CHECK_DOCS", 100)
+@mock.patch("src.rollover.time.monotonic")
+@mock.patch("src.rollover._checks", {})
+@mock.patch("src.rollover.send")
+def test_maybe_rollover_checks_by_docs_and_time(mock_send, mock_monotonic):
+    mock_send.return_value = mock_response(json_data={"rolled_over": False})
+    mock_monotonic.return_value = 1000.0
+
+    # first write checks, then only after 100 docs or 300 seconds
+    src.rollover.maybe_rollover("serviceA-write", 10)
+    src.rollover.maybe_rollover("serviceA-write", 60)
+    assert mock_send.call_count == 1
+    src.rollover.maybe_rollover("serviceA-write", 40)
+    assert mock_send.call_count == 2
+    mock_monotonic.return_value = 1301.0
+    src.rollover.maybe_rollover("serviceA-write", 1)
+    assert mock_send.call_count == 3
+
+    args, kwargs = mock_send.call_args
+    assert args[1] == "/serviceA-write/_rollover"
+    assert json.loads(kwargs["data"]) == {
+        "conditions": src.rollover.ROLLOVER_CONDITIONS
+    }
+
+
+@mock.patch("src.rollover._checks", {})
+@mock.patch("src.rollover.send")
+def test_maybe_rollover_rolled_over(mock_send):
+    mock_send.return_value = mock_response(
+        json_data={"rolled_over": True, "new_index": "serviceA-000002"}
+    )
+    assert src.rollover.maybe_rollover("serviceA-write", 1)
+
+
+@mock.patch("src.rollover._checks", {})
+@mock.patch("src.rollover.send")
+def test_maybe_rollover_fail(mock_send):
+    mock_send.return_value = None
+    assert not src.rollover.maybe_rollover("serviceA-write", 1)
+    mock_send.return_value = mock_response()
+    mock_send.return_value.json.side_effect = ValueError("not json")
+    src.rollover._checks.clear()
+    assert not src.rollover.maybe_rollover("serviceA-write", 1)
+
+
+"""
+es_stream alias mode tests
+
+"""
+
+
+@mock.patch("src.es_stream.WRITE_MODE", "alias")
+def test_identify_index_alias():
+    assert src.es_stream.identify_index("serviceA/2020-01-01/log001") == (
+        "serviceA-write"
+    )
+    assert not src.es_stream.identify_index("something/random")
+
+
+@mock.patch("src.es_stream.WRITE_MODE", "alias")
+@mock.patch("src.es_stream.index_exists")
+@mock.patch("src.es_stream.alias_ready")
+def test_index_ready_alias(mock_alias_ready, mock_index_exists):
+    mock_alias_ready.return_value = True
+    assert src.es_stream.index_ready("serviceA-write")
+    assert not mock_index_exists.called
+
+
+@mock.patch("src.es_stream.WRITE_MODE", "alias")
+@mock.patch("src.es_stream.maybe_rollover")
+@mock.patch("src.es_stream.send")
+def test_bulk_index_alias_counts_docs(mock_send, mock_maybe_rollover):
+    mock_send.return_value = mock.Mock(status_code=200, text="updated")
+    bulk_doc = src.es_stream.prepare_bulk_doc(['{"a": 1}', '{"a": 2}'])
+    assert src.es_stream.bulk_index("serviceA-write", bulk_doc)
+    mock_maybe_rollover.assert_called_once_with("serviceA-write", 2)
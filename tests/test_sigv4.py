@@ -0,0 +1,122 @@
+import datetime
+import mock
+import requests
+from botocore.credentials import Credentials
+
+from .context import src
+
+# aws sigv4 test suite credentials and request time
+CREDENTIALS = Credentials("AKIDEXAMPLE", "wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY")
+NOW = datetime.datetime(2015, 8, 30, 12, 36, 0)
+
+"""
+sign_headers tests
+
+"""
+
+
+def test_sign_headers_get_vanilla():
+    headers = src.sigv4.sign_headers(
+        "GET",
+        "https://example.amazonaws.com/",
+        credentials=CREDENTIALS,
+        now=NOW,
+        region="us-east-1",
+        service="service",
+    )
+    assert headers == {
+        "x-amz-date": "20150830T123600Z",
+        "Authorization": "AWS4-HMAC-SHA256 "
+        "Credential=AKIDEXAMPLE/20150830/us-east-1/service/aws4_request, "
+        "SignedHeaders=host;x-amz-date, "
+        "Signature=5fa00fa31553b73ebf1942676e86291e8372ff2a2260956d9b8aae1d763fbf31",
+    }
+
+
+def test_sign_headers_get_vanilla_query_order():
+    headers = src.sigv4.sign_headers(
+        "GET",
+        "https://example.amazonaws.com/?Param2=value2&Param1=value1",
+        credentials=CREDENTIALS,
+        now=NOW,
+        region="us-east-1",
+        service="service",
+    )
+    assert headers["Authorization"].endswith(
+        "Signature=b97d918cfa904a5beff61c982a1b6f458b799221646efd99d3219ec94cdf2500"
+    )
+
+
+def test_sign_headers_session_token():
+    credentials = Credentials("AKID", "SECRET", "TOKEN")
+    headers = src.sigv4.sign_headers(
+        "POST", "https://es/index/_doc/_bulk", "{}\n", credentials, NOW
+    )
+    assert headers["x-amz-security-token"] == "TOKEN"
+    assert "SignedHeaders=host;x-amz-date;x-amz-security-token" in (
+        headers["Authorization"]
+    )
+
+
+def test_sign_headers_body_str_bytes_equal():
+    str_headers = src.sigv4.sign_headers(
+        "POST", "https://es/i/_bulk", "body", CREDENTIALS, NOW
+    )
+    bytes_headers = src.sigv4.sign_headers(
+        "POST", "https://es/i/_bulk", b"body", CREDENTIALS, NOW
+    )
+    assert str_headers == bytes_headers
+
+
+"""
+cache tests
+
+"""
+
+
+@mock.patch("src.sigv4._hmac", wraps=src.sigv4._hmac)
+def test_signing_key_cached(mock_hmac):
+    src.sigv4._signing_keys.clear()
+    for _ in range(3):
+        src.sigv4.sign_headers("GET", "https://es/", credentials=CREDENTIALS, now=NOW)
+    # key derivation takes four hmacs, only done for the first request
+    assert mock_hmac.call_count == 4
+
+    later = NOW + datetime.timedelta(days=1)
+    src.sigv4.sign_headers("GET", "https://es/", credentials=CREDENTIALS, now=later)
+    assert mock_hmac.call_count == 8
+    assert len(src.sigv4._signing_keys) == 1
+
+
+@mock.patch("src.sigv4._credentials", None)
+@mock.patch("src.sigv4.boto3.Session")
+def test_get_credentials_resolved_once(mock_session):
+    mock_session.return_value.get_credentials.return_value = CREDENTIALS
+    for _ in range(3):
+        assert src.sigv4.get_credentials().access_key == "AKIDEXAMPLE"
+    assert mock_session.call_count == 1
+
+
+"""
+es_auth tests
+
+"""
+
+
+@mock.patch("src.sigv4.ES_SIGN_REQUESTS", False)
+def test_es_auth_disabled():
+    assert src.sigv4.es_auth() is None
+
+
+@mock.patch("src.sigv4.get_credentials")
+@mock.patch("src.sigv4.ES_SIGN_REQUESTS", True)
+def test_es_auth_signs_request(mock_get_credentials):
+    mock_get_credentials.return_value = CREDENTIALS
+    auth = src.sigv4.es_auth()
+    r = requests.Request(
+        "POST", "https://es/index/_doc/_bulk", data="doc1", auth=auth
+    ).prepare()
+    assert r.headers["Authorization"].startswith(
+        "AWS4-HMAC-SHA256 Credential=AKIDEXAMPLE/"
+    )
+    assert "x-amz-date" in r.headers
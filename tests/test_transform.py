@@ -0,0 +1,123 @@
+import json
+import mock
+
+from .context import src
+
+"""
+transform_doc tests
+
+"""
+
+
+def test_transform_doc_drop():
+    doc = {"message": "ok", "stack_trace": "...", "request": {"body": "x", "id": 1}}
+    rules = {"drop": ["stack_trace", "request.body", "missing.field"]}
+    assert src.transform.transform_doc(doc, rules) == {
+        "message": "ok",
+        "request": {"id": 1},
+    }
+
+
+def test_transform_doc_rename():
+    doc = {"msg": "ok", "req": {"id": 1}}
+    rules = {"rename": {"msg": "message", "req.id": "request.id", "nope": "x"}}
+    assert src.transform.transform_doc(doc, rules) == {
+        "message": "ok",
+        "req": {},
+        "request": {"id": 1},
+    }
+
+
+def test_transform_doc_flatten():
+    doc = {"a": {"b": 1, "c": {"d": "e"}}, "f": {}, "g": [1, 2]}
+    rules = {"flatten": True}
+    assert src.transform.transform_doc(doc, rules) == {
+        "a.b": 1,
+        "a.c.d": "e",
+        "f": {},
+        "g": [1, 2],
+    }
+
+
+def test_transform_doc_truncate():
+    doc = {"message": "abcdef", "tags": ["abcdef", 1], "nested": {"k": "abcdef"}}
+    rules = {"truncate": 3}
+    assert src.transform.transform_doc(doc, rules) == {
+        "message": "abc",
+        "tags": ["abc", 1],
+        "nested": {"k": "abc"},
+    }
+
+
+@mock.patch("src.transform.random.random")
+def test_transform_doc_sample_out(mock_random):
+    mock_random.return_value = 0.5
+    rules = {"sample": {"field": "level", "rates": {"debug": 0.1}}}
+    assert src.transform.transform_doc({"level": "DEBUG"}, rules) is None
+
+
+@mock.patch("src.transform.random.random")
+def test_transform_doc_sample_keep(mock_random):
+    mock_random.return_value = 0.05
+    rules = {"sample": {"rates": {"debug": 0.1}}}
+    assert src.transform.transform_doc({"level": "debug"}, rules) == {"level": "debug"}
+
+
+def test_transform_doc_sample_other_level_kept():
+    rules = {"sample": {"rates": {"debug": 0.0}}}
+    assert src.transform.transform_doc({"level": "error"}, rules) == {"level": "error"}
+    assert src.transform.transform_doc({"message": "no level"}, rules) == {
+        "message": "no level"
+    }
+
+
+def test_transform_doc_non_dict_untouched():
+    assert src.transform.transform_doc([1, 2], {"drop": ["a"]}) == [1, 2]
+
+
+"""
+prepare_bulk_doc with transforms tests
+
+"""
+
+
+@mock.patch.dict(
+    "src.es_stream.TRANSFORMS",
+    {"serviceA": {"drop": ["stack_trace"], "truncate": 4}},
+)
+def test_prepare_bulk_doc_transformed():
+    docs = [json.dumps({"message": "hello world", "stack_trace": "x" * 1000})]
+    bulk_doc = """{"index":{}}
+{"message": "hell"}
+"""
+    assert src.es_stream.prepare_bulk_doc(docs, "serviceA") == bulk_doc
+    assert "stack_trace" in src.es_stream.prepare_bulk_doc(docs, "serviceB")
+
+
+@mock.patch.dict(
+    "src.es_stream.TRANSFORMS", {"serviceA": {"sample": {"rates": {"debug": 0.0}}}}
+)
+def test_prepare_bulk_doc_all_sampled_out_empty():
+    # nothing to index, but unlike invalid json this is not an error
+    docs = [json.dumps({"level": "debug"})]
+    assert src.es_stream.prepare_bulk_doc(docs, "serviceA") == ""
+    assert src.es_stream.prepare_bulk_doc(["invalid_json"], "serviceA") is False
+
+
+def test_prepare_bulk_doc_bytes_reduced():
+    docs = [
+        json.dumps(
+            {
+                "level": "error",
+                "message": "failed",
+                "stack_trace": "Traceback\n" * 200,
+                "request": {"body": "x" * 4096, "path": "/a"},
+            }
+        )
+        for _ in range(50)
+    ]
+    rules = {"drop": ["stack_trace", "request.body"], "flatten": True}
+    with mock.patch.dict("src.es_stream.TRANSFORMS", {"serviceA": rules}):
+        transformed = src.es_stream.prepare_bulk_doc(docs, "serviceA")
+    original = src.es_stream.prepare_bulk_doc(docs)
+    assert len(transformed.encode()) * 10 < len(original.encode())
@@ -0,0 +1,256 @@
+import mock
+import requests
+import threading
+
+from .context import src
+import src.helper
+
+A = "http://a:9200"
+B = "http://b:9200"
+C = "http://c:9200"
+
+"""
+reusable endpoint state
+
+"""
+
+
+def nodes(*endpoints, **state):
+    return {
+        e: dict({"in_flight": 0, "failures": 0, "dead_until": 0.0}, **state)
+        for e in endpoints
+    }
+
+
+def mock_response(status=200, json_data=None):
+    mock_resp = mock.Mock()
+    mock_resp.status_code = status
+    mock_resp.json = mock.Mock(return_value=json_data)
+    return mock_resp
+
+
+"""
+select tests
+
+"""
+
+
+@mock.patch.dict("src.transport._nodes", nodes(A, B, C), clear=True)
+def test_select_round_robin():
+    first = [src.transport.select()[0] for _ in range(6)]
+    assert sorted(first) == [A, A, B, B, C, C]
+    assert first[0] != first[1] != first[2]
+
+
+@mock.patch("src.transport.ES_BALANCE", "least_in_flight")
+@mock.patch.dict("src.transport._nodes", nodes(A, B, C), clear=True)
+def test_select_least_in_flight():
+    src.transport._nodes[A]["in_flight"] = 2
+    src.transport._nodes[B]["in_flight"] = 1
+    for _ in range(3):
+        assert src.transport.select() == [C, B, A]
+
+
+@mock.patch("src.transport.time.monotonic", return_value=100.0)
+@mock.patch.dict("src.transport._nodes", nodes(A, B, C), clear=True)
+def test_select_dead_last(mock_monotonic):
+    src.transport._nodes[A]["dead_until"] = 200.0
+    src.transport._nodes[B]["dead_until"] = 150.0
+    for _ in range(3):
+        assert src.transport.select() == [C, B, A]
+
+
+@mock.patch("src.transport.sniff")
+@mock.patch("src.transport.ES_SNIFF_INTERVAL", 300)
+@mock.patch("src.transport.ES_SNIFF", True)
+@mock.patch("src.transport._last_sniff", None)
+@mock.patch("src.transport.time.monotonic", return_value=5.0)
+@mock.patch.dict("src.transport._nodes", nodes(A), clear=True)
+def test_select_sniffs_first_time_after_boot(mock_monotonic, mock_sniff):
+    # monotonic time is only seconds after a fresh boot, the first select
+    # still sniffs
+    src.transport.select()
+    assert mock_sniff.call_count == 1
+
+
+@mock.patch("src.transport.sniff")
+@mock.patch("src.transport.ES_SNIFF_INTERVAL", 300)
+@mock.patch("src.transport.ES_SNIFF", True)
+@mock.patch("src.transport.time.monotonic")
+@mock.patch.dict("src.transport._nodes", nodes(A), clear=True)
+def test_select_sniffs_after_interval(mock_monotonic, mock_sniff):
+    with mock.patch("src.transport._last_sniff", 1000.0):
+        mock_monotonic.return_value = 1200.0
+        src.transport.select()
+        assert not mock_sniff.called
+        mock_monotonic.return_value = 1301.0
+        src.transport.select()
+        assert mock_sniff.called
+
+
+"""
+mark_dead tests
+
+"""
+
+
+@mock.patch("src.transport.time.monotonic", return_value=0.0)
+@mock.patch("src.transport.ES_DEAD_BACKOFF_MAX", 100)
+@mock.patch("src.transport.ES_DEAD_BACKOFF", 30)
+@mock.patch.dict("src.transport._nodes", nodes(A, B), clear=True)
+def test_mark_dead_backoff(mock_monotonic):
+    dead_until = []
+    for _ in range(4):
+        src.transport.mark_dead(A + "/index/_doc/_bulk")
+        dead_until.append(src.transport._nodes[A]["dead_until"])
+    assert dead_until == [30, 60, 100, 100]
+    assert src.transport._nodes[B]["dead_until"] == 0.0
+
+    src.transport.mark_alive(A)
+    assert src.transport._nodes[A] == nodes(A)[A]
+
+
+@mock.patch.dict("src.transport._nodes", nodes(A), clear=True)
+def test_mark_dead_unknown_url():
+    src.transport.mark_dead("http://a:92001/index")
+    src.transport.mark_dead("someurl")
+    assert src.transport._nodes == nodes(A)
+
+
+"""
+send tests
+
+"""
+
+
+@mock.patch.dict("src.transport._nodes", nodes(A, B), clear=True)
+def test_send_fails_over():
+    def request(url, **kwargs):
+        if url.startswith(A):
+            return src.helper.CONNECTION_FAILED
+        return "response from " + url
+
+    for _ in range(2):
+        assert src.transport.send(request, "/index", data="doc") == (
+            "response from " + B + "/index"
+        )
+    assert src.transport._nodes[A]["failures"] == 1
+    assert src.transport._nodes[B]["in_flight"] == 0
+
+
+@mock.patch.dict("src.transport._nodes", nodes(A, B), clear=True)
+def test_send_all_dead_none():
+    request = mock.Mock(return_value=src.helper.CONNECTION_FAILED)
+    assert src.transport.send(request, "/index") is None
+    assert request.call_count == 2
+    assert src.transport._nodes[A]["failures"] == 1
+    assert src.transport._nodes[B]["failures"] == 1
+
+
+@mock.patch.dict("src.transport._nodes", nodes(A), clear=True)
+def test_send_success_after_other_request_failed():
+    # another request marked the endpoint dead while this one was in flight
+    def request(url, **kwargs):
+        src.transport.mark_dead(url)
+        return "ok"
+
+    assert src.transport.send(request, "/index") == "ok"
+    assert src.transport._nodes[A]["failures"] == 0
+
+
+@mock.patch.dict("src.transport._nodes", nodes(A, B), clear=True)
+def test_send_http_error_no_failover():
+    # the helpers return None on http errors too, that is not a dead node
+    request = mock.Mock(return_value=None)
+    assert src.transport.send(request, "/index") is None
+    assert request.call_count == 1
+
+
+@mock.patch.dict("src.transport._nodes", nodes(A, B, failures=2), clear=True)
+def test_send_success_marks_alive():
+    request = mock.Mock(return_value="ok")
+    assert src.transport.send(request, "/index") == "ok"
+    assert sum(n["failures"] for n in src.transport._nodes.values()) == 2
+
+
+@mock.patch("src.helper.requests.post")
+@mock.patch.dict("src.transport._nodes", nodes(A, B), clear=True)
+def test_send_post_request_connection_error_fails_over(mock_request):
+    def post(url, **kwargs):
+        r = mock_response()
+        r.raise_for_status = mock.Mock()
+        if url.startswith(A):
+            r.raise_for_status.side_effect = requests.exceptions.ConnectionError()
+        return r
+
+    mock_request.side_effect = post
+    for _ in range(2):
+        r = src.transport.send(src.helper.post_request, "/index/_bulk", data="")
+        assert r.status_code == 200
+    assert src.transport._nodes[A]["failures"] == 1
+
+
+@mock.patch("src.helper.requests.post")
+@mock.patch.dict("src.transport._nodes", nodes(A, B), clear=True)
+def test_send_post_request_read_timeout_not_resent(mock_request):
+    # the bulk may have been applied before the response timed out, sending
+    # it to another endpoint could index the docs twice
+    mock_request.side_effect = requests.exceptions.ReadTimeout()
+    assert src.transport.send(src.helper.post_request, "/index/_bulk", data="") is None
+    assert mock_request.call_count == 1
+    assert sum(n["failures"] for n in src.transport._nodes.values()) == 0
+
+
+@mock.patch.dict("src.transport._nodes", nodes(A, B), clear=True)
+def test_node_state_shared_across_threads():
+    # executor threads send while the event loop does, and sniffing adds nodes
+    def worker(i):
+        for j in range(500):
+            for endpoint in src.transport.select():
+                src.transport.begin(endpoint)
+                src.transport.end(endpoint)
+            src.transport.mark_dead(A + "/index")
+            src.transport.add_endpoint("http://n{}-{}:9200".format(i, j % 10))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(src.transport._nodes) == 2 + 8 * 10
+    assert all(n["in_flight"] == 0 for n in src.transport._nodes.values())
+    assert src.transport._nodes[A]["failures"] == 8 * 500
+
+
+"""
+sniff tests
+
+"""
+
+
+@mock.patch("src.transport.requests.get")
+@mock.patch.dict("src.transport._nodes", nodes(A), clear=True)
+def test_sniff_adds_nodes(mock_get):
+    mock_get.return_value = mock_response(
+        json_data={
+            "nodes": {
+                "n1": {"http": {"publish_address": "10.0.0.1:9200"}},
+                "n2": {"http": {"publish_address": "node2/10.0.0.2:9200"}},
+                "n3": {},
+            }
+        }
+    )
+    assert src.transport.sniff()
+    assert list(src.transport._nodes) == [
+        A,
+        "http://10.0.0.1:9200",
+        "http://10.0.0.2:9200",
+    ]
+
+
+@mock.patch("src.transport.requests.get")
+@mock.patch.dict("src.transport._nodes", nodes(A), clear=True)
+def test_sniff_fail(mock_get):
+    mock_get.side_effect = requests.exceptions.ConnectionError("connection")
+    assert not src.transport.sniff()
+    assert list(src.transport._nodes) == [A]